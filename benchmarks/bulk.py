@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+'''
+Measure bulk commands throughput and memory against a local fake udata API.
+
+Each scenario runs ``ucli`` in a child process (so its peak memory is
+isolated from the fake server one) against a freshly populated catalog.
+Results can be saved as JSON and compared to a previous run to catch
+throughput regressions.
+'''
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from os.path import dirname, abspath
+
+from fakeserver import FakeServer, FakeUdata
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+SCENARIOS = ('dispatch', 'transfer', 'delete')
+
+#: Results table row
+ROW = ('{scenario:<10} {size:>8} {duration:>10.2f} {throughput:>10.1f} {requests:>10} '
+       '{rss:>12.1f}{failed}')
+
+
+def child(rss_file, args):
+    '''Run ucli in process and write its peak RSS (in KB) on exit'''
+    import atexit
+
+    sys.path.insert(0, ROOT)
+    from ucli.cli import cli
+
+    def write_rss():
+        with open(rss_file, 'w') as f:
+            f.write(str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+    atexit.register(write_rss)
+    cli(args, prog_name='ucli')
+
+
+def populate(udata, scenario, size):
+    '''Populate the catalog, returns the ucli arguments and input for the scenario'''
+    organizations = [udata.add_organization() for _ in range(20)]
+    source = udata.add_organization('Source organization')
+    udata.add_organization('Target organization')
+    items = [udata.add_item(organization=source if scenario == 'transfer' else None)
+             for _ in range(size)]
+    if scenario == 'transfer':
+        return ['transfer'], '1\n4\nSource\n1\n2\nTarget\n1\nBenchmark\ny\n', None
+    csvfile = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+    with csvfile:
+        if scenario == 'dispatch':
+            csvfile.write('dataset,organization\n')
+            for index, item in enumerate(items):
+                organization = organizations[index % len(organizations)]
+                csvfile.write('{0},{1}\n'.format(item['id'], organization['id']))
+            return ['dispatch', '--force', csvfile.name], '0\n1\n1\n1\nBenchmark\n', csvfile.name
+        csvfile.write('id\n')
+        for item in items:
+            csvfile.write('{0}\n'.format(item['id']))
+        return ['datasets', 'delete', csvfile.name], '', csvfile.name
+
+
+def run(scenario, size, options):
+    udata = FakeUdata(latency=options.latency, error_rate=options.error_rate)
+    args, stdin, csvfile = populate(udata, scenario, size)
+    if options.concurrency > 1 and scenario in ('dispatch', 'delete'):
+        args += ['--concurrency', str(options.concurrency)]
+    fd, rss_file = tempfile.mkstemp(suffix='.rss')
+    os.close(fd)  # Written by the child process
+    with FakeServer(udata) as server:
+        cmd = [sys.executable, abspath(__file__), '--child', rss_file, '--',
+               '--url', server.url, '--token', 'benchmark',
+               '--pool-maxsize', str(max(10, options.concurrency))] + args
+        start = time.perf_counter()
+        process = subprocess.run(cmd, input=stdin.encode('utf8'),
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        duration = time.perf_counter() - start
+    try:
+        with open(rss_file) as f:
+            rss = int(f.read())
+    except (OSError, ValueError):
+        rss = 0
+    finally:
+        os.remove(rss_file)
+    if csvfile:
+        os.remove(csvfile)
+    if process.returncode:
+        sys.stderr.write(process.stderr.decode('utf8')[-2000:])
+    return {
+        'scenario': scenario,
+        'size': size,
+        'duration': duration,
+        'throughput': size / duration,
+        'requests': udata.requests,
+        'peak_rss_kb': rss if sys.platform != 'darwin' else rss // 1024,
+        'exit_code': process.returncode,
+    }
+
+
+def compare(results, baseline, tolerance):
+    '''Returns the list of throughput regressions compared to a baseline'''
+    reference = {(r['scenario'], r['size']): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = reference.get((result['scenario'], result['size']))
+        if before and result['throughput'] < before['throughput'] * (1 - tolerance):
+            regressions.append((result, before))
+    return regressions
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        return child(sys.argv[2], sys.argv[4:])
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-s', '--scenario', action='append', choices=SCENARIOS,
+                        help='Scenarios to run (all by default)')
+    parser.add_argument('-n', '--size', action='append', type=int,
+                        help='Number of rows/items (default: {0})'.format(
+                            ', '.join(map(str, DEFAULT_SIZES))))
+    parser.add_argument('-c', '--concurrency', type=int, default=1, help='Commands concurrency')
+    parser.add_argument('--latency', type=float, default=0, help='Fake API latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='Ratio of fake API calls failing with a 503')
+    parser.add_argument('-o', '--output', help='Save results as JSON into this file')
+    parser.add_argument('--baseline', help='Compare throughputs with a previous JSON output')
+    parser.add_argument('--tolerance', type=float, default=.2,
+                        help='Accepted throughput loss ratio compared to the baseline')
+    options = parser.parse_args()
+
+    results = []
+    print('{0:<10} {1:>8} {2:>10} {3:>10} {4:>10} {5:>12}'.format(
+        'Scenario', 'Size', 'Time (s)', 'Rows/s', 'Requests', 'Peak RSS (MB)'))
+    for scenario in options.scenario or SCENARIOS:
+        for size in options.size or DEFAULT_SIZES:
+            result = run(scenario, size, options)
+            results.append(result)
+            print(ROW.format(rss=result['peak_rss_kb'] / 1024.,
+                             failed=' FAILED' if result['exit_code'] else '', **result))
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            regressions = compare(results, json.load(f), options.tolerance)
+        for result, before in regressions:
+            print('Regression on {scenario} ({size}): {throughput:.1f} rows/s'.format(**result),
+                  'instead of {throughput:.1f}'.format(**before))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
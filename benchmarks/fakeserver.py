@@ -0,0 +1,324 @@
+'''
+An in-process stand-in of the udata API used by the benchmarks.
+
+It only implements the endpoints and payload fields ucli relies on
+and can inject latency and errors to mimic a remote instance.
+'''
+import gzip
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+DEFAULT_PAGE_SIZE = 20
+
+#: Responses smaller than this are never compressed
+MIN_COMPRESS_SIZE = 1024
+
+ITEM_URL = re.compile(r'^(?P<kind>datasets|reuses|organizations|users)/(?P<id>[^/]+)/$')
+LIST_URL = re.compile(r'^(?P<kind>datasets|reuses|organizations|users)/$')
+SUGGEST_URL = re.compile(r'^(?P<kind>datasets|reuses|organizations|users)/suggest/$')
+TRANSFER_URL = re.compile(r'^transfer/(?P<id>[^/]+)/$')
+
+#: Supported list filters
+FILTERS = ('owner', 'organization', 'tag', 'sort')
+
+#: Fields matched by suggestions
+SUGGEST_FIELDS = ('id', 'name', 'title', 'first_name', 'last_name')
+
+
+def make_id():
+    return uuid.uuid4().hex[:24]
+
+
+class FakeUdata(object):
+    '''In-memory udata catalog'''
+
+    def __init__(self, latency=0, error_rate=0, error_status=503, admin=True):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.lock = threading.Lock()
+        self.me = {
+            'id': make_id(),
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'roles': ['admin'] if admin else [],
+            'organizations': [],
+        }
+        self.store = {
+            'datasets': {},
+            'reuses': {},
+            'organizations': {},
+            'users': {self.me['id']: self.me},
+        }
+        self.deleted = set()
+        self.transfers = {}
+        self.requests = 0
+        self.version = 0  # Bumped on each mutation to invalidate listings
+        self._listings = {}
+
+    def add_organization(self, name=None):
+        name = name or 'Organization {0}'.format(len(self.store['organizations']))
+        org = {'id': make_id(), 'name': name}
+        org['last_modified'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.store['organizations'][org['id']] = org
+        self.version += 1
+        return org
+
+    def add_user(self, first_name='Jane', last_name=None):
+        user = {'id': make_id(), 'first_name': first_name,
+                'last_name': last_name or 'Doe {0}'.format(len(self.store['users'])),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        self.store['users'][user['id']] = user
+        self.version += 1
+        return user
+
+    def add_item(self, kind='datasets', owner=None, organization=None, **extra):
+        item = {
+            'id': make_id(),
+            'title': 'Item {0}'.format(len(self.store[kind])),
+            'owner': owner,
+            'organization': organization,
+            'tags': [],
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime()),
+            'last_modified': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        item['slug'] = item['title'].lower().replace(' ', '-')
+        item.update(extra)
+        self.store[kind][item['id']] = item
+        self.version += 1
+        return item
+
+    def site(self):
+        return {
+            'title': 'Fake udata',
+            'metrics': {
+                'datasets': len(self.store['datasets']),
+                'reuses': len(self.store['reuses']),
+                'organizations': len(self.store['organizations']),
+                'users': len(self.store['users']),
+                'discussions': 0,
+            }
+        }
+
+    def filtered(self, kind, qs):
+        '''Filtered and sorted items, memoized until the next mutation'''
+        key = (kind, self.version) + tuple(qs.get(k) for k in FILTERS)
+        if key not in self._listings:
+            items = list(self.store[kind].values())
+            for attr in ('owner', 'organization'):
+                if attr in qs:
+                    items = [i for i in items if (i.get(attr) or {}).get('id') == qs[attr]]
+            if 'tag' in qs:
+                items = [i for i in items if qs['tag'] in i.get('tags', [])]
+            if qs.get('sort', '').lstrip('-') in ('last_modified', 'created'):
+                attr = qs['sort'].lstrip('-')
+                # Datasets and reuses creation date is ``created_at``
+                items.sort(key=lambda i: i.get(attr) or i.get(attr + '_at', ''),
+                           reverse=qs['sort'].startswith('-'))
+            self._listings = {key: items}
+        return self._listings[key]
+
+    def list(self, kind, url, qs):
+        items = self.filtered(kind, qs)
+        page = int(qs.get('page', 1))
+        page_size = int(qs.get('page_size', DEFAULT_PAGE_SIZE))
+        start = (page - 1) * page_size
+        data = items[start:start + page_size]
+        next_page = None
+        if start + page_size < len(items):
+            next_qs = dict(qs, page=page + 1, page_size=page_size)
+            query = '&'.join('{0}={1}'.format(*kv) for kv in next_qs.items())
+            next_page = '{0}?{1}'.format(url, query)
+        return {
+            'data': data,
+            'page': page,
+            'page_size': page_size,
+            'total': len(items),
+            'next_page': next_page,
+            'previous_page': None,
+        }
+
+    def suggest(self, kind, qs):
+        q = qs.get('q', '').lower()
+        size = int(qs.get('size', 10))
+        results = []
+        for item in self.store[kind].values():
+            text = ' '.join(str(item.get(k, '')) for k in SUGGEST_FIELDS)
+            if q in text.lower():
+                results.append(item)
+            if len(results) >= size:
+                break
+        return results
+
+    def transfer(self, payload):
+        transfer = {
+            'id': make_id(),
+            'subject': payload['subject'],
+            'recipient': payload['recipient'],
+            'comment': payload.get('comment'),
+        }
+        self.transfers[transfer['id']] = transfer
+        return transfer
+
+    def accept(self, transfer_id):
+        transfer = self.transfers.get(transfer_id)
+        if transfer is None:
+            return None
+        kind = 'datasets' if transfer['subject']['class'] == 'Dataset' else 'reuses'
+        item = self.store[kind].get(transfer['subject']['id'])
+        recipient = transfer['recipient']
+        if recipient['class'] == 'Organization':
+            item['organization'] = self.store['organizations'][recipient['id']]
+            item['owner'] = None
+        else:
+            item['owner'] = self.store['users'][recipient['id']]
+            item['organization'] = None
+        item['last_modified'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.version += 1
+        return transfer
+
+    def handle(self, method, path, qs, payload):
+        '''Return a (status, payload) pair'''
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            return self.error_status, {'message': 'Injected error'}
+        path = path.split('/api/1/', 1)[-1]
+        with self.lock:
+            if method == 'GET':
+                if path == 'me':
+                    return 200, self.me
+                if path == 'site':
+                    return 200, self.site()
+                match = SUGGEST_URL.match(path)
+                if match:
+                    return 200, self.suggest(match.group('kind'), qs)
+                match = LIST_URL.match(path)
+                if match:
+                    return 200, self.list(match.group('kind'), self.url + path, qs)
+                match = ITEM_URL.match(path)
+                if match:
+                    if match.group('id') in self.deleted:
+                        return 410, {'message': 'Deleted'}
+                    item = self.store[match.group('kind')].get(match.group('id'))
+                    if item is None:
+                        return 404, {'message': 'Not found'}
+                    return 200, item
+            elif method == 'DELETE':
+                match = ITEM_URL.match(path)
+                if match:
+                    if match.group('id') in self.deleted:
+                        return 410, {'message': 'Deleted'}
+                    item = self.store[match.group('kind')].pop(match.group('id'), None)
+                    if item is None:
+                        return 404, {'message': 'Not found'}
+                    self.deleted.add(item['id'])
+                    self.version += 1
+                    return 204, None
+            elif method == 'POST':
+                if path == 'transfer/':
+                    return 201, self.transfer(payload)
+                match = TRANSFER_URL.match(path)
+                if match:
+                    transfer = self.accept(match.group('id'))
+                    if transfer is None:
+                        return 404, {'message': 'Not found'}
+                    return 200, transfer
+        return 404, {'message': 'Unknown endpoint'}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def dispatch(self):
+        parts = urlsplit(self.path)
+        qs = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length)) if length else None
+        status, data = self.server.udata.handle(self.command, parts.path, qs, payload)
+        body = json.dumps(data).encode('utf8') if data is not None else b''
+        etag = None
+        if self.command == 'GET' and status == 200:
+            etag = '"{0}"'.format(hashlib.md5(body).hexdigest())
+            if self.headers.get('If-None-Match') == etag:
+                status, body = 304, b''
+        gzipped = (self.server.compress and len(body) >= MIN_COMPRESS_SIZE
+                   and 'gzip' in self.headers.get('Accept-Encoding', ''))
+        if gzipped:
+            body = gzip.compress(body, compresslevel=6)
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = dispatch
+
+
+class FakeServer(object):
+    '''Run a `FakeUdata` instance on a local port in a background thread'''
+
+    def __init__(self, udata=None, port=0, compress=False, **kwargs):
+        self.udata = udata or FakeUdata(**kwargs)
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.compress = compress  # Gzip responses like a reverse proxy would
+        self.httpd.udata = self.udata
+        self.url = 'http://127.0.0.1:{0}/'.format(self.httpd.server_port)
+        self.udata.url = self.url + 'api/1/'
+        # A short poll interval makes shutdowns (ie. between tests) fast
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       kwargs={'poll_interval': .05}, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve a fake udata API')
+    parser.add_argument('--port', type=int, default=7000)
+    parser.add_argument('--datasets', type=int, default=1000, help='Number of generated datasets')
+    parser.add_argument('--organizations', type=int, default=10,
+                        help='Number of generated organizations')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Latency added to each response in seconds')
+    parser.add_argument('--error-rate', type=float, default=0, help='Ratio of responses failing')
+    parser.add_argument('--gzip', action='store_true', help='Gzip responses when accepted')
+    args = parser.parse_args()
+
+    udata = FakeUdata(latency=args.latency, error_rate=args.error_rate)
+    organizations = [udata.add_organization() for _ in range(args.organizations)]
+    for index in range(args.datasets):
+        udata.add_item(organization=organizations[index % len(organizations)])
+    server = FakeServer(udata, port=args.port, compress=args.gzip)
+    print('Serving a fake udata API on {0}'.format(server.url))
+    server.httpd.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+'''
+Measure JSON decoding and transfer of large ``datasets/`` pages.
+
+It compares the available JSON backends on a page of realistic datasets,
+the page size on the wire for each content encoding, and iterating over
+a paginated listing served by the fake udata API with whole pages decoding
+versus incremental parsing (time to first item and total time).
+'''
+import argparse
+import gzip
+import json
+import sys
+import time
+
+from os.path import dirname, abspath
+
+from fakeserver import FakeServer, FakeUdata
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ucli import jsonlib  # noqa: E402
+from ucli.api import Api  # noqa: E402
+
+DEFAULT_PAGE_SIZE = 1000
+
+LOREM = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor '
+         'incididunt ut labore et dolore magna aliqua. ')
+
+
+def dataset_extra(index):
+    '''Fields making a dataset payload about as large as a real one'''
+    return {
+        'description': LOREM * 8,
+        'created_at': '2017-05-{0:02d}T10:00:00'.format(index % 28 + 1),
+        'frequency': 'monthly',
+        'license': 'lov2',
+        'tags': ['tag-{0}'.format(t) for t in range(index % 7)],
+        'extras': {'source': 'benchmark', 'index': index, 'weight': index / 3.},
+        'resources': [{
+            'id': 'resource-{0}-{1}'.format(index, r),
+            'title': 'Resource {0}'.format(r),
+            'url': 'https://static.example.org/datasets/{0}/resource-{1}.csv'.format(index, r),
+            'format': 'csv',
+            'filesize': 1024 * (r + 1),
+            'checksum': {'type': 'sha1', 'value': '{0:040x}'.format(index * 31 + r)},
+        } for r in range(3)],
+    }
+
+
+def backends():
+    '''All the installed JSON decoders'''
+    decoders = {'json': json.loads}
+    for name in ('orjson', 'ujson'):
+        try:
+            decoders[name] = __import__(name).loads
+        except ImportError:
+            pass
+    return decoders
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def decoding(body, repeat):
+    print('Decoding a {0:.1f} KB page (best of {1})'.format(len(body) / 1024., repeat))
+    baseline = None
+    for name, loads in backends().items():
+        duration = best_of(lambda: loads(body), repeat)
+        baseline = baseline or duration
+        print('  {0:<8} {1:8.2f} ms  x{2:.1f}'.format(name, duration * 1000, baseline / duration))
+
+
+def encodings(body):
+    print('Page size on the wire')
+    sizes = {'identity': len(body), 'gzip': len(gzip.compress(body, compresslevel=6))}
+    try:
+        import brotli
+        sizes['br'] = len(brotli.compress(body, quality=5))
+    except ImportError:
+        pass
+    for name, size in sizes.items():
+        print('  {0:<8} {1:8.1f} KB  {2:5.1f}%'.format(name, size / 1024., 100. * size / len(body)))
+
+
+def iterate(url, page_size, stream):
+    api = Api(url, None)
+    start = time.perf_counter()
+    first = None
+    count = 0
+    for _ in api.paginate('datasets/', page_size=page_size, stream=stream):
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    api.close()
+    return first, time.perf_counter() - start, count
+
+
+def listing(udata, page_size, compress):
+    print('Iterating over {0} datasets by pages of {1} ({2})'.format(
+        len(udata.store['datasets']), page_size, 'gzip' if compress else 'identity'))
+    with FakeServer(udata, compress=compress) as server:
+        modes = [('whole pages', False)]
+        if jsonlib.INCREMENTAL:
+            modes.append(('incremental', True))
+        else:
+            print('  incremental parsing requires ijson')
+        for label, stream in modes:
+            iterate(server.url, page_size, stream)  # Warm up the server listing cache
+            first, total, count = iterate(server.url, page_size, stream)
+            print('  {0:<12} first item {1:8.2f} ms  total {2:8.2f} ms  ({3} items)'.format(
+                label, first * 1000, total * 1000, count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE,
+                        help='Number of datasets per page')
+    parser.add_argument('--pages', type=int, default=5, help='Number of pages of the listing')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of decoding runs')
+    args = parser.parse_args()
+
+    print('ucli JSON backend: {0}, accepted encodings: {1}'.format(
+        jsonlib.BACKEND, Api.DEFAULT_HEADERS['Accept-Encoding']))
+    udata = FakeUdata()
+    organization = udata.add_organization()
+    for index in range(args.page_size * args.pages):
+        udata.add_item(organization=organization, **dataset_extra(index))
+    page = udata.list('datasets', 'http://localhost/api/1/datasets/',
+                      {'page_size': str(args.page_size)})
+    body = json.dumps(page).encode('utf8')
+
+    decoding(body, args.repeat)
+    encodings(body)
+    for compress in (False, True):
+        listing(udata, args.page_size, compress)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+'''
+Measure ``ucli`` startup time.
+
+Each scenario is run in a fresh interpreter several times and the best
+and mean wall-clock times are reported. The ``eager`` scenario emulates
+the former startup: every command module imported and the API client
+with its HTTP session built before anything else.
+'''
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+from os.path import dirname, abspath
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+EAGER = '''
+from ucli.cli import cli, COMMANDS
+from ucli.api import Api
+for name in COMMANDS:
+    cli.get_command(None, name)
+Api('http://localhost:7000', None).session
+'''
+
+SCENARIOS = (
+    ('interpreter', [sys.executable, '-c', 'pass']),
+    ('eager', [sys.executable, '-c', EAGER]),
+    ('ucli --help', [sys.executable, '-m', 'ucli', '--help']),
+    ('ucli status --help', [sys.executable, '-m', 'ucli', 'status', '--help']),
+    ('ucli datasets delete --help', [sys.executable, '-m', 'ucli', 'datasets', 'delete', '--help']),
+)
+
+
+def measure(cmd, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--runs', type=int, default=20, help='Runs per scenario')
+    args = parser.parse_args()
+
+    print('{0:<30} {1:>10} {2:>10}'.format('Scenario', 'Best (ms)', 'Mean (ms)'))
+    for name, cmd in SCENARIOS:
+        timings = measure(cmd, args.runs)
+        print('{0:<30} {1:>10.1f} {2:>10.1f}'.format(
+            name, min(timings) * 1000, statistics.mean(timings) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -105,6 +105,8 @@ install_requires = ['click', 'requests']
 setup_requires = ['pytest-runner'] if needs_pytest else []
 tests_require = ['pytest', 'pytest-click']
 qa_require = ['pytest-cov', 'flake8']
+speedups_require = ['orjson', 'ijson', 'brotli']
+async_require = ['aiohttp']
 
 
 setup(
@@ -123,6 +125,8 @@ setup(
     extras_require={
         'test': tests_require,
         'qa': qa_require,
+        'speedups': speedups_require,
+        'async': async_require,
     },
     entry_points={
         'console_scripts': [
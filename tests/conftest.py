@@ -0,0 +1,69 @@
+import logging
+import os
+import sys
+
+import pytest
+
+from click.testing import CliRunner
+
+# The fake udata API lives with the benchmarks
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from fakeserver import FakeServer  # noqa: E402
+
+from ucli.api import Api  # noqa: E402
+from ucli.cli import cli  # noqa: E402
+from ucli.log import AsyncHandler, CliHandler  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    '''A fake udata API served on a local port'''
+    with FakeServer() as server:
+        yield server
+
+
+@pytest.fixture
+def udata(server):
+    '''The fake API in-memory catalog'''
+    return server.udata
+
+
+@pytest.fixture
+def api(server, tmp_path):
+    '''A client of the fake API, retrying without delay and caching into a temporary directory'''
+    api = Api(server.url, 'token', retries=2, backoff=0, cache_dir=str(tmp_path / 'cache'))
+    yield api
+    api.close()
+
+
+@pytest.fixture
+def fail_with(udata, monkeypatch):
+    '''Make the fake API answer the next requests with the given statuses'''
+    def fail_with(*statuses):
+        statuses = list(statuses)
+        handle = udata.handle
+
+        def failing(method, path, qs, payload):
+            if statuses:
+                udata.requests += 1
+                return statuses.pop(0), {'message': 'Injected error'}
+            return handle(method, path, qs, payload)
+        monkeypatch.setattr(udata, 'handle', failing)
+    return fail_with
+
+
+@pytest.fixture
+def ucli(server, tmp_path):
+    '''Invoke ``ucli`` against the fake API, returns the click result'''
+    def invoke(*args, **kwargs):
+        options = ['--url', server.url, '--token', 'token',
+                   '--cache-dir', str(tmp_path / 'cache')]
+        return CliRunner().invoke(cli, options + list(args), **kwargs)
+    yield invoke
+    logger = logging.getLogger()
+    for handler in list(logger.handlers):  # Installed by the invocations
+        if isinstance(handler, (CliHandler, AsyncHandler)):
+            logger.removeHandler(handler)
+            handler.close()
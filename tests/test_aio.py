@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from fakeserver import FakeServer, FakeUdata  # noqa: E402
+
+from ucli.aio import AsyncApi  # noqa: E402
+
+
+def run(api, coroutine):
+    '''Run a coroutine using ``api`` and close its session'''
+    async def main():
+        async with api:
+            return await coroutine(api)
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def make_api(server, tmp_path):
+    def make_api(url=None, **kwargs):
+        kwargs.setdefault('retries', 2)
+        return AsyncApi(url or server.url, 'token', backoff=0, cache_dir=str(tmp_path), **kwargs)
+    return make_api
+
+
+class TestAsyncApi(object):
+    def test_verbs(self, make_api, udata):
+        org = udata.add_organization()
+        dataset = udata.add_item()
+
+        async def scenario(api):
+            site = await api.get('site', fields='title')
+            missing = await api.get('datasets/unknown/', allow_failure=True)
+            transfer = await api.post('transfer/', {
+                'subject': {'class': 'Dataset', 'id': dataset['id']},
+                'recipient': {'class': 'Organization', 'id': org['id']},
+            })
+            accepted = await api.post('transfer/{0}/'.format(transfer['id']),
+                                      {'response': 'accept'})
+            deleted = await api.delete('datasets/{0}/'.format(dataset['id']))
+            return site, missing, accepted, deleted
+        site, missing, accepted, deleted = run(make_api(), scenario)
+        assert site['title'] == 'Fake udata'
+        assert missing.status_code == 404
+        assert missing.error_details
+        assert accepted['recipient']['id'] == org['id']
+        assert deleted.status_code == 204
+        assert dataset['organization']['id'] == org['id']
+
+    def test_failure_exits(self, make_api):
+        with pytest.raises(SystemExit):
+            run(make_api(), lambda api: api.get('datasets/unknown/'))
+
+    def test_get_retried_on_transient_status(self, make_api, udata, fail_with):
+        fail_with(503, 502)
+        assert run(make_api(), lambda api: api.get('site'))['title'] == 'Fake udata'
+        assert udata.requests == 3
+
+    def test_post_not_retried_on_transient_status(self, make_api, udata, fail_with):
+        fail_with(503)
+        response = run(make_api(), lambda api: api.post('transfer/', {}, allow_failure=True))
+        assert response.status_code == 503
+        assert response.error_details == 'Injected error'
+        assert udata.requests == 1
+
+    def test_post_retried_when_unprocessed(self, make_api, udata, fail_with):
+        fail_with(429)
+        run(make_api(), lambda api: api.post('transfer/', {'subject': {}, 'recipient': {}}))
+        assert udata.requests == 2
+        assert len(udata.transfers) == 1
+
+    def test_post_retried_when_never_sent(self, make_api, monkeypatch):
+        api = make_api('http://127.0.0.1:1/')
+        calls = []
+        send = api.send
+
+        async def counting_send(*args, **kwargs):
+            calls.append(args)
+            return await send(*args, **kwargs)
+        monkeypatch.setattr(api, 'send', counting_send)
+        with pytest.raises(SystemExit):
+            run(api, lambda api: api.post('transfer/', {}))
+        assert len(calls) == 3
+
+    def test_paginate(self, make_api, udata):
+        ids = [udata.add_item()['id'] for _ in range(7)]
+
+        async def scenario(api):
+            pages = api.paginate('datasets/', fields='id', page_size=3)
+            return [item['id'] async for item in pages]
+        assert run(make_api(), scenario) == ids
+        assert udata.requests == 3
+
+    def test_stats(self, make_api, fail_with):
+        api = make_api(stats=True)
+        fail_with(503)
+        run(api, lambda api: api.get('site'))
+        endpoint = api.stats.as_dict()['endpoints']['GET site']
+        assert endpoint['calls'] == 2
+        assert endpoint['errors'] == 1
+        assert endpoint['statuses'] == {'503': 1, '200': 1}
+        assert endpoint['bytes_in'] > 0
+
+    def test_http_cache(self, make_api, udata):
+        api = make_api(http_cache=True)
+
+        async def scenario(api):
+            first = await api.get('site')
+            second = await api.get('site')
+            return first, second
+        first, second = run(api, scenario)
+        assert first == second
+        assert api.http_cache.as_dict() == {'hits': 0, 'revalidated': 1, 'misses': 1}
+
+    def test_rate_limit(self, make_api):
+        api = make_api(rate_limit=20)
+        api.rate_limiter.tokens = 1  # No burst
+
+        async def scenario(api):
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            await asyncio.gather(*(api.get('site') for _ in range(5)))
+            return loop.time() - start
+        assert run(api, scenario) >= .15
+
+    def test_adaptive_concurrency(self, tmp_path):
+        with FakeServer(FakeUdata(latency=.02)) as server:
+            api = AsyncApi(server.url, 'token', adaptive=True, pool_maxsize=4,
+                           cache_dir=str(tmp_path))
+            limiter = api.limiter
+            try_acquire = limiter.try_acquire
+            inflight = []
+
+            def recording_try_acquire():
+                wait = try_acquire()
+                inflight.append(limiter.inflight)
+                return wait
+            limiter.try_acquire = recording_try_acquire
+
+            async def scenario(api):
+                return await asyncio.gather(*(api.get('site') for _ in range(20)))
+            assert len(run(api, scenario)) == 20
+        assert inflight[0] == 1
+        assert max(inflight) <= 4  # Never above the maximum despite 20 concurrent requests
+        assert limiter.inflight == 0
+
+
+def test_bench_command(ucli, udata):
+    for index in range(10):
+        udata.add_item(title='Dataset about things {0}'.format(index))
+    result = ucli('bench', '--concurrency', '20', '--duration', '1')
+    assert result.exit_code == 0, result.output
+    assert 'Throughput' in result.output
+    assert udata.requests > 20
@@ -0,0 +1,162 @@
+import time
+
+import pytest
+import requests
+
+from ucli import jsonlib
+from ucli.api import Api
+
+
+class SendCounter(object):
+    '''Count ``Api.send`` calls, raising ``error`` instead of sending if given'''
+    def __init__(self, api, monkeypatch, error=None):
+        self.calls = 0
+        self.error = error
+        self.send = api.send
+        monkeypatch.setattr(api, 'send', self)
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.send(*args, **kwargs)
+
+
+class TestRetries(object):
+    def test_get_retried_on_transient_status(self, api, udata, fail_with):
+        fail_with(503, 502)
+        assert api.get('site')['title'] == 'Fake udata'
+        assert udata.requests == 3
+
+    def test_get_gives_up_after_retries(self, api, udata, fail_with):
+        fail_with(503, 503, 503, 503)
+        response = api.get('site', allow_failure=True)
+        assert response.status_code == 503
+        assert response.error_details == 'Injected error'
+        assert udata.requests == 3
+
+    def test_get_not_retried_on_client_error(self, api, udata, fail_with):
+        fail_with(404)
+        assert api.get('site', allow_failure=True).status_code == 404
+        assert udata.requests == 1
+
+    def test_no_retries(self, server, udata, fail_with, tmp_path):
+        api = Api(server.url, 'token', retries=0, cache_dir=str(tmp_path))
+        fail_with(503)
+        assert api.get('site', allow_failure=True).status_code == 503
+        assert udata.requests == 1
+
+    def test_post_not_retried_on_transient_status(self, api, udata, fail_with):
+        fail_with(503)
+        response = api.post('transfer/', {'subject': {}, 'recipient': {}}, allow_failure=True)
+        assert response.status_code == 503
+        assert udata.requests == 1
+        assert not udata.transfers
+
+    def test_post_retried_when_unprocessed(self, api, udata, fail_with):
+        fail_with(429)
+        response = api.post('transfer/', {'subject': {}, 'recipient': {}})
+        assert response['id'] in udata.transfers
+        assert udata.requests == 2
+
+    def test_idempotent_post_retried(self, api, udata, fail_with):
+        fail_with(503)
+        api.post('transfer/', {'subject': {}, 'recipient': {}}, idempotent=True)
+        assert udata.requests == 2
+
+    def test_delete_retried_on_network_error(self, api, monkeypatch):
+        counter = SendCounter(api, monkeypatch, requests.exceptions.ReadTimeout())
+        with pytest.raises(SystemExit):
+            api.delete('datasets/xyz/')
+        assert counter.calls == 3
+
+    def test_post_not_retried_once_sent(self, api, monkeypatch):
+        counter = SendCounter(api, monkeypatch, requests.exceptions.ReadTimeout())
+        with pytest.raises(SystemExit):
+            api.post('transfer/', {})
+        assert counter.calls == 1
+
+    def test_post_retried_when_never_sent(self, monkeypatch, tmp_path):
+        api = Api('http://127.0.0.1:1/', 'token', retries=2, backoff=0, cache_dir=str(tmp_path))
+        counter = SendCounter(api, monkeypatch)
+        with pytest.raises(SystemExit):
+            api.post('transfer/', {})
+        assert counter.calls == 3
+
+
+class TestPaginator(object):
+    @pytest.mark.parametrize('count,requests_count', [(7, 3), (6, 2), (3, 1), (1, 1)])
+    def test_page_boundaries(self, api, udata, count, requests_count):
+        ids = [udata.add_item()['id'] for _ in range(count)]
+        assert [item['id'] for item in api.paginate('datasets/', page_size=3)] == ids
+        assert udata.requests == requests_count
+
+    def test_empty_result(self, api, udata):
+        items = api.paginate('datasets/', page_size=3)
+        assert items.total == 0
+        assert list(items) == []
+        assert udata.requests == 1
+
+    def test_total_reuses_the_first_page(self, api, udata):
+        ids = [udata.add_item()['id'] for _ in range(5)]
+        items = api.paginate('datasets/', fields='id', page_size=2)
+        assert items.total == 5
+        assert udata.requests == 1
+        assert [item['id'] for item in items] == ids
+        assert udata.requests == 3
+
+    def test_prefetch_keeps_the_order(self, api, udata):
+        ids = [udata.add_item()['id'] for _ in range(10)]
+        items = iter(api.paginate('datasets/', fields='id', page_size=3, prefetch=True))
+        assert next(items)['id'] == ids[0]
+        # The next page is fetched in background while the first one is consumed
+        deadline = time.monotonic() + 1
+        while udata.requests < 2 and time.monotonic() < deadline:
+            time.sleep(.01)
+        assert udata.requests == 2
+        assert [item['id'] for item in items] == ids[1:]
+        assert udata.requests == 4
+
+
+class TestStreamedPaginator(object):
+    @pytest.fixture(autouse=True)
+    def incremental(self):
+        pytest.importorskip('ijson')
+
+    def test_streamed_pages(self, api, udata, monkeypatch):
+        ids = [udata.add_item()['id'] for _ in range(7)]
+        pages = []
+        iter_items = api.iter_items
+        monkeypatch.setattr(api, 'iter_items', lambda url, *args, **kwargs: (
+            pages.append(url) or iter_items(url, *args, **kwargs)))
+        items = api.paginate('datasets/', fields='id', page_size=3, stream=True)
+        assert [item['id'] for item in items] == ids
+        assert len(pages) == 3
+        assert items.total == 7
+
+    def test_first_page_reused_once_total_is_known(self, api, udata):
+        ids = [udata.add_item()['id'] for _ in range(5)]
+        items = api.paginate('datasets/', fields='id', page_size=2, stream=True)
+        assert items.total == 5
+        assert [item['id'] for item in items] == ids
+        assert udata.requests == 3
+
+    def test_empty_result(self, api, udata):
+        assert list(api.paginate('datasets/', stream=True)) == []
+        assert udata.requests == 1
+
+    def test_falls_back_to_pages_without_ijson(self, api, udata, monkeypatch):
+        ids = [udata.add_item()['id'] for _ in range(4)]
+        monkeypatch.setattr(jsonlib, 'INCREMENTAL', False)
+        monkeypatch.setattr(api, 'iter_items', None)  # Never called
+        items = api.paginate('datasets/', page_size=3, stream=True)
+        assert not items.stream
+        assert [item['id'] for item in items] == ids
+
+    def test_disabled_by_the_http_cache(self, server, udata, tmp_path):
+        udata.add_item()
+        api = Api(server.url, 'token', http_cache=True, cache_dir=str(tmp_path))
+        items = api.paginate('datasets/', stream=True)
+        assert not items.stream
+        assert len(list(items)) == 1
+        assert api.http_cache.as_dict()['misses'] == 1
@@ -0,0 +1,80 @@
+import os
+
+from ucli.cache import CachedGetter, DiskCache, LRUCache
+
+
+class TestLRUCache(object):
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+        assert 'b' not in cache
+        assert len(cache) == 2
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    def test_hits_and_misses(self):
+        cache = LRUCache()
+        assert cache.get('a', 'default') == 'default'
+        cache.set('a', None)
+        assert cache.get('a', 'default') is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_discard(self):
+        cache = LRUCache()
+        cache.set('a', 1)
+        cache.discard('a')
+        cache.discard('unknown')
+        assert 'a' not in cache
+
+
+class TestCachedGetter(object):
+    def test_responses_and_not_found_are_cached(self, api, udata):
+        dataset = udata.add_item()
+        getter = CachedGetter(api)
+        path = 'datasets/{0}/'.format(dataset['id'])
+        assert getter.get(path)['id'] == dataset['id']
+        assert getter.get(path)['id'] == dataset['id']
+        assert getter.get('datasets/unknown/').status_code == 404
+        assert getter.get('datasets/unknown/').status_code == 404
+        assert udata.requests == 2
+        assert (getter.hits, getter.misses) == (2, 2)
+
+    def test_transient_failures_are_not_cached(self, api, udata, fail_with):
+        getter = CachedGetter(api)
+        fail_with(500, 500, 500)
+        assert getter.get('site').status_code == 500
+        assert getter.get('site')['title'] == 'Fake udata'
+
+
+class TestDiskCache(object):
+    def test_get_set(self, tmp_path):
+        cache = DiskCache(str(tmp_path / 'cache'))
+        assert cache.get('key', 'default') == 'default'
+        cache.set('key', {'some': ['value']})
+        assert cache.get('key') == {'some': ['value']}
+        assert DiskCache(str(tmp_path / 'cache')).get('key') == {'some': ['value']}
+        cache.discard('key')
+        assert cache.get('key') is None
+
+    def test_least_recently_used_are_evicted(self, tmp_path):
+        value = 'x' * 98  # 100 bytes once JSON encoded
+        cache = DiskCache(str(tmp_path), max_size=500)
+        for index, key in enumerate('abcde'):
+            cache.set(key, value)
+            os.utime(cache.filename(key), (index, index))
+        assert cache.get('a') == value  # Now the most recently used
+        assert cache.size() == 500
+        cache.set('f', value)
+        # Evicted down to 90% of the maximum size, least recently used first
+        assert cache.size() == 400
+        assert [k for k in 'abcdef' if cache.get(k)] == ['a', 'd', 'e', 'f']
+
+    def test_size_is_computed_from_existing_entries(self, tmp_path):
+        cache = DiskCache(str(tmp_path))
+        cache.set('a', 'x' * 98)
+        cache.set('a', 'x' * 48)
+        assert cache.size() == 50
+        assert DiskCache(str(tmp_path)).size() == 50
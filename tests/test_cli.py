@@ -0,0 +1,15 @@
+import importlib
+
+import pytest
+
+from ucli import cli
+from ucli.commands import datasets
+
+
+@pytest.mark.parametrize('registry', [cli.COMMANDS, datasets.COMMANDS],
+                         ids=['ucli', 'datasets'])
+def test_registry_short_help_matches_the_commands(registry):
+    for name, (path, short_help) in registry.items():
+        module, attr = path.split(':')
+        command = getattr(importlib.import_module(module), attr)
+        assert short_help == command.get_short_help_str(limit=1000), name
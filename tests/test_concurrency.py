@@ -0,0 +1,97 @@
+import itertools
+import threading
+import time
+
+import pytest
+
+from ucli.concurrency import imap, pipeline
+
+
+class Boom(Exception):
+    pass
+
+
+class TestImap(object):
+    def test_single_worker(self):
+        assert list(imap(lambda x: x * 2, range(5))) == [0, 2, 4, 6, 8]
+
+    def test_order_is_kept(self):
+        def slow_first(x):
+            time.sleep(.05 if x == 0 else 0)
+            return x
+        assert list(imap(slow_first, range(10), workers=4)) == list(range(10))
+
+    def test_input_is_consumed_lazily(self):
+        results = imap(lambda x: x, itertools.count(), workers=4, backlog=8)
+        assert list(itertools.islice(results, 20)) == list(range(20))
+        results.close()
+
+    def test_error_is_raised(self):
+        def fail(x):
+            if x == 3:
+                raise Boom()
+            return x
+        with pytest.raises(Boom):
+            list(imap(fail, range(10), workers=2))
+
+
+class TestPipeline(object):
+    def test_all_stages_are_applied(self):
+        results = pipeline(range(20), (lambda x: x + 1, 3), (lambda x: x * 10, 2))
+        assert sorted(results) == [x * 10 for x in range(1, 21)]
+
+    def test_stages_run_concurrently(self):
+        active = set()
+        seen = set()
+        lock = threading.Lock()
+
+        def stage(name):
+            def func(x):
+                with lock:
+                    active.add(name)
+                    seen.add(frozenset(active))
+                time.sleep(.01)
+                with lock:
+                    active.discard(name)
+                return x
+            return func
+        assert len(list(pipeline(range(20), (stage('a'), 1), (stage('b'), 1)))) == 20
+        assert frozenset('ab') in seen
+
+    def test_error_is_raised_and_stops(self):
+        processed = []
+
+        def fail(x):
+            processed.append(x)
+            if x == 5:
+                raise Boom()
+            return x
+        results = []
+        with pytest.raises(Boom):
+            # An endless input only ends if the pipeline stops on error
+            for result in pipeline(itertools.count(), (fail, 2), (lambda x: x, 2), backlog=4):
+                results.append(result)
+        assert 5 not in results
+        assert len(processed) < 20
+
+    def test_input_error_is_raised(self):
+        def items():
+            yield 1
+            raise Boom()
+        with pytest.raises(Boom):
+            list(pipeline(items(), (lambda x: x, 2)))
+
+    def test_consumer_stopping_stops_the_pipeline(self):
+        fed = []
+
+        def items():
+            for x in itertools.count():
+                fed.append(x)
+                yield x
+        results = pipeline(items(), (lambda x: x, 2), backlog=4)
+        assert next(results) is not None
+        results.close()
+        time.sleep(.1)
+        count = len(fed)
+        time.sleep(.1)
+        assert len(fed) == count
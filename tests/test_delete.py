@@ -0,0 +1,76 @@
+import click
+import pytest
+
+from datetime import datetime, timedelta, timezone
+
+from ucli.commands.datasets.delete import iter_matching, parse_date, parse_filters
+
+
+@pytest.mark.parametrize('value,expected', [
+    ('2020-01-01T12:00:00', datetime(2020, 1, 1, 12, tzinfo=timezone.utc)),
+    ('2020-01-01T12:00:00.123456', datetime(2020, 1, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)),
+    ('2020-01-01T12:00:00Z', datetime(2020, 1, 1, 12, tzinfo=timezone.utc)),
+    ('2020-01-01T12:00:00+02:00', datetime(2020, 1, 1, 10, tzinfo=timezone.utc)),
+    ('2020-01-01', datetime(2020, 1, 1, tzinfo=timezone.utc)),
+    ('not a date', None),
+    ('', None),
+    (None, None),
+])
+def test_parse_date(value, expected):
+    assert parse_date(value) == expected
+
+
+def test_parse_filters():
+    assert parse_filters(None, None, ('tag=x', 'license=cc-by', 'q=a=b')) == {
+        'tag': 'x', 'license': 'cc-by', 'q': 'a=b'}
+    with pytest.raises(click.BadParameter):
+        parse_filters(None, None, ('tag',))
+    with pytest.raises(click.BadParameter):
+        parse_filters(None, None, ('=x',))
+
+
+class TestIterMatching(object):
+    def listing(self, api, filters):
+        return api.paginate('datasets/', fields='id,created_at', prefetch=True, **filters)
+
+    def test_datasets_shifted_by_deletions_are_swept_again(self, api, udata):
+        matching = [udata.add_item(tags=['x'])['id'] for _ in range(12)]
+        others = [udata.add_item()['id'] for _ in range(3)]
+        filters = {'tag': 'x', 'page_size': 5}
+        deleted = []
+        for id in iter_matching(api, self.listing(api, filters), filters):
+            api.delete('datasets/{0}/'.format(id))
+            deleted.append(id)
+        # A single pass over the shifting pages misses some datasets
+        assert sorted(deleted) == sorted(matching)
+        assert udata.deleted == set(matching)
+        assert not udata.deleted & set(others)
+
+    def test_each_dataset_is_yielded_once(self, api, udata):
+        matching = [udata.add_item(tags=['x'])['id'] for _ in range(7)]
+        filters = {'tag': 'x', 'page_size': 3}
+        # Nothing is deleted so the second sweep only finds known IDs
+        assert list(iter_matching(api, self.listing(api, filters), filters)) == matching
+
+    def test_datasets_created_after_confirmation_are_left(self, api, udata, caplog):
+        old = [udata.add_item(tags=['x'], created_at='2020-01-01T00:00:00')['id'] for _ in range(3)]
+        udata.add_item(tags=['x'], created_at='2020-06-01T12:00:00.123456')
+        # Before the confirmation in UTC, a string comparison would say after
+        old.append(udata.add_item(tags=['x'], created_at='2020-03-01T01:00:00+02:00')['id'])
+        # After the confirmation in UTC, a string comparison would say before
+        udata.add_item(tags=['x'], created_at='2020-02-29T23:30:00-01:00')
+        filters = {'tag': 'x'}
+        confirmed_at = datetime(2020, 3, 1, tzinfo=timezone.utc)
+        ids = iter_matching(api, self.listing(api, filters), filters, created_before=confirmed_at)
+        assert list(ids) == old
+        assert '2 matching dataset(s) created after the confirmation' in caplog.text
+
+    def test_dataset_created_after_confirmation_by_the_command(self, ucli, udata):
+        old = udata.add_item(tags=['x'])
+        udata.add_item(tags=['y'])
+        created_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+        recent = udata.add_item(tags=['x'], created_at=created_at.isoformat())
+        result = ucli('datasets', 'delete', '--tag', 'x', '--force')
+        assert result.exit_code == 0, result.output
+        assert udata.deleted == {old['id']}
+        assert recent['id'] in udata.store['datasets']
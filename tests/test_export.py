@@ -0,0 +1,44 @@
+import pytest
+
+from ucli.commands.datasets.export import flatten, top_level_fields
+
+
+@pytest.mark.parametrize('fields,names', [
+    ('id', ['id']),
+    ('id,title', ['id', 'title']),
+    (' id , title ', ['id', 'title']),
+    ('id,owner{id},organization{id,name}', ['id', 'owner', 'organization']),
+    ('resources{id,checksum{type,value}},tags', ['resources', 'tags']),
+    ('id,', ['id']),
+    ('', []),
+])
+def test_top_level_fields(fields, names):
+    assert top_level_fields(fields) == names
+
+
+@pytest.mark.parametrize('value,cell', [
+    (None, None),
+    ('title', 'title'),
+    (42, 42),
+    ({'id': 'abc', 'name': 'Org'}, 'abc'),
+    ({'type': 'md5', 'value': 'x'}, '{"type": "md5", "value": "x"}'),
+    ([], ''),
+    (['a', 'b'], 'a,b'),
+    ([{'id': 'r1'}, {'id': 'r2'}], 'r1,r2'),
+    ([1, None], '1,None'),
+])
+def test_flatten(value, cell):
+    assert flatten(value) == cell
+
+
+def test_export_csv(ucli, udata, tmp_path):
+    org = udata.add_organization()
+    datasets = [udata.add_item(organization=org, tags=['a', 'b']) for _ in range(5)]
+    output = tmp_path / 'out.csv'
+    # Missing fields (no license here) are exported as empty cells
+    result = ucli('datasets', 'export', '--page-size', '2', '--format', 'csv',
+                  '--fields', 'id,organization{id},tags,license', str(output))
+    assert result.exit_code == 0, result.output
+    assert 'Exported 5 dataset(s)' in result.output
+    assert output.read_text().splitlines() == ['id,organization,tags,license'] + [
+        '{0},{1},"a,b",'.format(d['id'], org['id']) for d in datasets]
@@ -0,0 +1,56 @@
+import click
+import pytest
+
+from ucli import fanout
+from ucli.fanout import Instance, Result, child_args, pair_instances, read_instances
+
+
+@pytest.mark.parametrize('args,expected', [
+    ([], []),
+    (['--url', 'https://a', '--url', 'https://b', '-v'], ['-v']),
+    (['--url=https://a', '--token=x', '--progress'], ['--progress']),
+    (['--instances', 'prod.ini', '--rate-limit', '5'], ['--rate-limit', '5']),
+    (['--instances=prod.ini', '--token', 'x', '--retries=2'], ['--retries=2']),
+    # Only exact options are stripped, not options sharing their prefix
+    (['--url-like', 'x', '--tokens=y'], ['--url-like', 'x', '--tokens=y']),
+])
+def test_child_args(args, expected):
+    assert child_args(args) == expected
+
+
+def test_pair_instances():
+    assert pair_instances(['https://a.org', 'https://b.org/'], ['x']) == [
+        Instance('a.org', 'https://a.org', 'x'), Instance('b.org', 'https://b.org/', 'x')]
+    assert [i.token for i in pair_instances(['https://a', 'https://b'], ['x', 'y'])] == ['x', 'y']
+    assert [i.token for i in pair_instances(['https://a'], [])] == [None]
+    with pytest.raises(click.BadParameter):
+        pair_instances(['https://a', 'https://b', 'https://c'], ['x', 'y'])
+
+
+def test_read_instances(tmp_path):
+    filename = tmp_path / 'instances.ini'
+    filename.write_text('[prod]\nurl = https://a\ntoken = x\n[demo]\nurl = https://b\n')
+    assert read_instances(str(filename)) == [
+        Instance('prod', 'https://a', 'x'), Instance('demo', 'https://b', None)]
+    filename.write_text('[prod]\ntoken = x\n')
+    with pytest.raises(SystemExit):
+        read_instances(str(filename))
+    with pytest.raises(SystemExit):
+        read_instances(str(tmp_path / 'missing.ini'))
+
+
+@pytest.mark.parametrize('codes,expected', [
+    ((0, 0), 0),
+    ((0, 1), 1),
+    ((0, -1), -1),  # exit() default code
+    ((2, -1, 0), 2),
+    ((1, -1), 1),  # The first instance wins a tie, whatever the completion order
+    ((-1, 1), -1),
+])
+def test_fanout_exit_code(codes, expected, monkeypatch):
+    instances = [Instance('i{0}'.format(n), 'https://i{0}'.format(n), None)
+                 for n in range(len(codes))]
+    code_by_instance = dict(zip(instances, codes))
+    monkeypatch.setattr(fanout, 'run_instance', lambda instance, args, stdin: Result(
+        instance, code_by_instance[instance], 'Done\n', 0))
+    assert fanout.fanout(instances, ['me'], stdin='') == expected
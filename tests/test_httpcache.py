@@ -0,0 +1,65 @@
+import pytest
+
+from ucli.api import Api
+from ucli.httpcache import HttpCache, max_age
+
+
+@pytest.fixture
+def cached_api(server, tmp_path):
+    api = Api(server.url, 'token', retries=0, cache_dir=str(tmp_path), http_cache=True, stats=True)
+    yield api
+    api.close()
+
+
+def test_max_age():
+    assert max_age({}) == 0
+    assert max_age({'Cache-Control': 'public, max-age=60'}) == 60
+
+
+class TestHttpCache(object):
+    def test_revalidation(self, cached_api, udata):
+        assert cached_api.get('site')['metrics']['datasets'] == 0
+        assert cached_api.get('site')['metrics']['datasets'] == 0
+        udata.add_item()
+        assert cached_api.get('site')['metrics']['datasets'] == 1
+        assert udata.requests == 3
+        assert cached_api.http_cache.as_dict() == {'hits': 0, 'revalidated': 1, 'misses': 2}
+
+    def test_fields_are_part_of_the_key(self, cached_api, udata):
+        cached_api.get('site', fields='title')
+        cached_api.get('site')
+        cached_api.get('site', fields='title')
+        assert cached_api.http_cache.as_dict() == {'hits': 0, 'revalidated': 1, 'misses': 2}
+
+    def test_fresh_responses_are_served_locally(self, api, udata, tmp_path):
+        cache = HttpCache(str(tmp_path / 'http'), 1024 * 1024)
+        cache.get(api, 'site')
+        entry = cache.store.get(cache.key(api.url('site'), None, {}))
+        entry['headers']['Cache-Control'] = 'max-age=60'
+        cache.store.set(cache.key(api.url('site'), None, {}), entry)
+        response = cache.get(api, 'site')
+        assert response.from_cache
+        assert response.json()['title'] == 'Fake udata'
+        assert udata.requests == 1
+        assert cache.as_dict() == {'hits': 1, 'revalidated': 0, 'misses': 1}
+
+    def test_failures_are_not_cached(self, cached_api, udata, fail_with):
+        fail_with(500)
+        assert cached_api.get('site', allow_failure=True).status_code == 500
+        assert cached_api.get('site')['title'] == 'Fake udata'
+        assert cached_api.http_cache.as_dict() == {'hits': 0, 'revalidated': 0, 'misses': 2}
+
+    def test_eviction(self, api, udata, tmp_path):
+        for _ in range(20):
+            udata.add_item()
+        cache = HttpCache(str(tmp_path / 'http'), 4096)
+        for page in range(1, 6):
+            cache.get(api, 'datasets/', params={'page': page, 'page_size': 4})
+        assert cache.store.size() <= 4096
+        assert len(cache.store.entries()) < 5
+
+    def test_counters_are_reported(self, cached_api):
+        cached_api.get('site')
+        cached_api.get('site')
+        assert cached_api.stats.as_dict()['http_cache'] == {
+            'hits': 0, 'revalidated': 1, 'misses': 1}
@@ -0,0 +1,102 @@
+import pytest
+
+from ucli.index import Index
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = Index(str(tmp_path / 'index' / 'test.sqlite'))
+    yield index
+    index.close()
+
+
+def add_datasets(udata, *dates, **extra):
+    return [udata.add_item(last_modified='2020-01-{0:02d}T00:00:00'.format(day), **extra)
+            for day in dates]
+
+
+class TestIndexSync(object):
+    def test_first_sync_fetches_everything(self, api, udata, index):
+        org = udata.add_organization()
+        datasets = add_datasets(udata, 1, 2, 3, organization=org)
+        assert index.sync(api, 'datasets') == 3
+        assert index.count('datasets') == 3
+        assert index.watermark('datasets') == '2020-01-03T00:00:00'
+        assert index.last_sync('datasets')
+        assert index.get('datasets', datasets[0]['id']) == {
+            'id': datasets[0]['id'],
+            'slug': datasets[0]['slug'],
+            'title': datasets[0]['title'],
+            'owner': None,
+            'organization': {'id': org['id']},
+            'last_modified': '2020-01-01T00:00:00',
+        }
+        assert index.get('datasets', 'unknown') is None
+
+    def test_incremental_sync_stops_at_the_watermark(self, api, udata, index):
+        first, second, third = add_datasets(udata, 1, 2, 3)
+        index.sync(api, 'datasets', page_size=2)
+        first.update(title='Renamed', last_modified='2020-01-05T00:00:00')
+        add_datasets(udata, 4)
+        del udata.store['datasets'][second['id']]
+        udata.version += 1
+        # The renamed and new datasets, then the one at the watermark
+        assert index.sync(api, 'datasets', page_size=2) == 3
+        assert index.get('datasets', first['id'])['title'] == 'Renamed'
+        assert index.count('datasets') == 4
+        # Deletions are only seen by a full sync
+        assert index.get('datasets', second['id'])
+
+    def test_full_sync_drops_deleted_objects(self, api, udata, index):
+        first, second = add_datasets(udata, 1, 2)
+        index.sync(api, 'datasets')
+        del udata.store['datasets'][second['id']]
+        udata.version += 1
+        assert index.sync(api, 'datasets', full=True) == 1
+        assert index.count('datasets') == 1
+        assert index.get('datasets', second['id']) is None
+
+    def test_interrupted_full_sync_keeps_the_index(self, api, udata, index, monkeypatch):
+        first, second, third = add_datasets(udata, 1, 2, 3)
+        index.sync(api, 'datasets')
+        del udata.store['datasets'][first['id']]
+        udata.version += 1
+        handle = udata.handle
+
+        def failing_after_first_page(method, path, qs, payload):
+            if 'page' in qs:
+                return 404, {'message': 'Injected error'}
+            return handle(method, path, qs, payload)
+        monkeypatch.setattr(udata, 'handle', failing_after_first_page)
+        with pytest.raises(SystemExit):
+            index.sync(api, 'datasets', full=True, page_size=1)
+        assert index.count('datasets') == 3
+        # Deletions are dropped once the full sync completes
+        monkeypatch.setattr(udata, 'handle', handle)
+        assert index.sync(api, 'datasets', full=True, page_size=1) == 2
+        assert index.get('datasets', first['id']) is None
+        assert index.get('datasets', third['id'])
+
+    def test_users_are_always_fully_synced(self, api, udata, index):
+        jane = udata.add_user('Jane', 'Doe')
+        john = udata.add_user('John', 'Smith')
+        assert index.sync(api, 'users') == 3  # Including the authenticated user
+        jane['first_name'] = 'Janet'
+        del udata.store['users'][john['id']]
+        udata.version += 1
+        assert index.sync(api, 'users') == 2
+        assert index.get('users', jane['id'])['first_name'] == 'Janet'
+        assert index.get('users', john['id']) is None
+
+    def test_search(self, api, udata, index):
+        org = udata.add_organization('Ministère de la Culture')
+        udata.add_organization('Ministère des Sports')
+        udata.add_organization('Culture et Sports')
+        index.sync(api, 'organizations')
+        names = [o['id'] for o in index.search('organizations', 'ministere culture', 10)]
+        assert names == [org['id']]
+        assert len(index.search('organizations', 'sports', 10)) == 2
+        assert len(index.search('organizations', 'sports', 1)) == 1
+        assert index.search('organizations', org['id'], 10)[0]['name'] == org['name']
+        assert index.search('organizations', '  ', 10) == []
+        assert index.search('organizations', '100%', 10) == []
@@ -0,0 +1,76 @@
+import json
+
+from ucli.journal import DONE, FAILED, PENDING, Journal, NullJournal, open_journal
+from ucli.log import BufferedLogger
+from ucli.plan import RESUMED, TRANSFERED, journal_key, plan_entry, plan_header, transfer
+
+
+class TestJournal(object):
+    def test_resume(self, tmp_path):
+        path = str(tmp_path / 'journal.jsonl')
+        with Journal(path) as journal:
+            journal.record('1:a', FAILED)
+            journal.record('2:b', DONE, transfer='t1')
+            journal.record('1:a', DONE)
+        with Journal(path) as journal:
+            assert len(journal) == 2
+            assert journal.is_done('1:a')
+            assert journal.get('2:b') == {'key': '2:b', 'status': DONE, 'transfer': 't1'}
+            assert not journal.is_done('3:c')
+            assert journal.get('3:c') is None
+
+    def test_truncated_line_is_ignored(self, tmp_path):
+        path = tmp_path / 'journal.jsonl'
+        path.write_text(json.dumps({'key': '1:a', 'status': DONE}) + '\n{"key": "2:b", "sta')
+        with Journal(str(path)) as journal:
+            assert len(journal) == 1
+            journal.record('2:b', DONE)
+        with Journal(str(path)) as journal:
+            assert journal.is_done('1:a')
+            assert journal.is_done('2:b')
+
+    def test_null_journal(self):
+        journal = open_journal(None)
+        assert isinstance(journal, NullJournal)
+        journal.record('1:a', DONE)
+        assert not journal.is_done('1:a')
+        assert len(journal) == 0
+
+
+class TestTransferResume(object):
+    def setup_transfer(self, udata):
+        org = udata.add_organization()
+        dataset = udata.add_item()
+        header = plan_header('Dataset', 'Organization', 'Moving')
+        entry = plan_entry(2, dataset, org)
+        return header, entry, dataset, org
+
+    def test_pending_transfer_is_reused(self, api, udata, tmp_path):
+        header, entry, dataset, org = self.setup_transfer(udata)
+        requested = udata.transfer({'subject': {'class': 'Dataset', 'id': dataset['id']},
+                                    'recipient': {'class': 'Organization', 'id': org['id']}})
+        with Journal(str(tmp_path / 'journal.jsonl')) as journal:
+            journal.record(journal_key(entry), PENDING, transfer=requested['id'])
+            assert transfer(api, header, entry, journal, BufferedLogger()) == TRANSFERED
+            assert journal.get(journal_key(entry)) == {
+                'key': journal_key(entry), 'status': DONE, 'transfer': requested['id']}
+        assert list(udata.transfers) == [requested['id']]
+        assert dataset['organization']['id'] == org['id']
+
+    def test_done_transfer_is_skipped(self, api, udata, tmp_path):
+        header, entry, dataset, org = self.setup_transfer(udata)
+        with Journal(str(tmp_path / 'journal.jsonl')) as journal:
+            journal.record(journal_key(entry), DONE)
+            assert transfer(api, header, entry, journal, BufferedLogger()) == RESUMED
+        assert udata.requests == 0
+        assert not udata.transfers
+
+    def test_transfer_is_journaled(self, api, udata, tmp_path):
+        header, entry, dataset, org = self.setup_transfer(udata)
+        with Journal(str(tmp_path / 'journal.jsonl')) as journal:
+            assert transfer(api, header, entry, journal, BufferedLogger()) == TRANSFERED
+        with Journal(str(tmp_path / 'journal.jsonl')) as journal:
+            state = journal.get(journal_key(entry))
+        assert state['status'] == DONE
+        assert state['transfer'] in udata.transfers
+        assert dataset['organization']['id'] == org['id']
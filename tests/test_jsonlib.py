@@ -0,0 +1,46 @@
+import io
+
+import pytest
+
+from ucli import jsonlib
+
+pytest.importorskip('ijson')
+
+
+class ChunkedReader(io.RawIOBase):
+    '''A binary stream returning at most ``size`` bytes per read, like a slow download'''
+    def __init__(self, data, size):
+        self.data = io.BytesIO(data)
+        self.size = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self.data.read(min(len(buffer), self.size))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+@pytest.mark.parametrize('size', [1, 7, 4096])
+def test_iter_items_across_chunks(size):
+    page = {
+        'data': [
+            {'id': 'a', 'title': 'Données', 'tags': ['x', 'y'], 'owner': {'id': 'u'}},
+            {'id': 'b', 'title': None, 'tags': [], 'owner': None, 'score': 1.5},
+        ],
+        'next_page': 'https://example.org/api/1/datasets/?page=2',
+        'page': 1,
+        'total': 3,
+    }
+    meta = {}
+    reader = ChunkedReader(jsonlib.dumps(page).encode('utf8'), size)
+    assert list(jsonlib.iter_items(reader, meta)) == page['data']
+    assert meta == {'next_page': page['next_page'], 'page': 1, 'total': 3}
+
+
+def test_iter_items_scalars():
+    reader = io.BytesIO(b'{"total": 2, "data": [1, "two", [3]]}')
+    meta = {}
+    assert list(jsonlib.iter_items(reader, meta)) == [1, 'two', [3]]
+    assert meta == {'total': 2}
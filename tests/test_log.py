@@ -0,0 +1,141 @@
+import io
+import logging
+import sys
+import threading
+
+import click
+import pytest
+
+from ucli import utils
+from ucli.log import AsyncHandler, BufferedLogger, CliFormatter, CliHandler
+
+
+def capture(monkeypatch):
+    '''
+    A single stream capturing both stdout and stderr in order.
+    Not a fixture as pytest restores its own capture between the fixtures setup and the test.
+    '''
+    stream = io.StringIO()
+    monkeypatch.setattr(sys, 'stdout', stream)
+    monkeypatch.setattr(sys, 'stderr', stream)
+    return stream
+
+
+@pytest.fixture
+def logger():
+    logger = logging.getLogger('ucli.tests')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    yield logger
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def make_handler(logger, **kwargs):
+    target = CliHandler()
+    target.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    handler = AsyncHandler(target, **kwargs)
+    logger.addHandler(handler)
+    return handler
+
+
+class TestAsyncHandler(object):
+    def test_flush_orders_records_before_direct_output(self, logger, monkeypatch):
+        output = capture(monkeypatch)
+        handler = make_handler(logger)
+        # flush_logs() flushes the root logger handlers
+        monkeypatch.setattr(logging.getLogger(), 'handlers', [handler])
+        for index in range(50):
+            logger.info('record %s', index)
+        utils.echo('echoed')
+        logger.warning('warned')
+        monkeypatch.setattr(sys, 'stdin', io.StringIO('answer\ny\n'))
+        assert utils.prompt('Question') == 'answer'
+        assert utils.confirm('Sure ?')
+        lines = output.getvalue().splitlines()
+        assert lines[:50] == ['INFO record {0}'.format(i) for i in range(50)]
+        assert lines[50:52] == ['echoed', 'WARNING warned']
+        assert lines[52].startswith('Question')
+
+    def test_records_are_merged_when_emitted(self, logger, monkeypatch):
+        output = capture(monkeypatch)
+        handler = make_handler(logger)
+        data = {'state': 'before'}
+        logger.info('data %s', data)
+        data['state'] = 'after'
+        handler.flush()
+        assert output.getvalue() == "INFO data {'state': 'before'}\n"
+
+    def test_consecutive_records_are_written_at_once(self, logger, monkeypatch):
+        output = capture(monkeypatch)
+        writes = []
+        echo = click.echo
+        monkeypatch.setattr(click, 'echo', lambda text, **kwargs: (
+            writes.append(text), echo(text, **kwargs)))
+        handler = make_handler(logger, batch_size=4)
+        # Block the writer thread on the first record while the next ones are queued
+        rendering, release = threading.Event(), threading.Event()
+        render = handler.target.render
+
+        def blocking_render(record):
+            rendering.set()
+            release.wait(1)
+            return render(record)
+        handler.target.render = blocking_render
+        logger.info('first')
+        assert rendering.wait(1)
+        for index in range(6):
+            logger.info('queued %s', index)
+        logger.warning('error stream')
+        release.set()
+        handler.flush()
+        assert output.getvalue().splitlines() == (
+            ['INFO first'] + ['INFO queued {0}'.format(i) for i in range(6)]
+            + ['WARNING error stream'])
+        # The first record alone, then batches of 4 records,
+        # each one written with one call per stream
+        assert writes == [
+            'INFO first',
+            'INFO queued 0\nINFO queued 1\nINFO queued 2\nINFO queued 3',
+            'INFO queued 4\nINFO queued 5',
+            'WARNING error stream',
+        ]
+
+    def test_close_drains_the_queue(self, logger, monkeypatch):
+        output = capture(monkeypatch)
+        handler = make_handler(logger)
+        for index in range(100):
+            logger.info('record %s', index)
+        logger.removeHandler(handler)
+        handler.close()
+        assert not handler.thread.is_alive()
+        assert len(output.getvalue().splitlines()) == 100
+
+    def test_progress_only_displays_warnings(self, logger, monkeypatch):
+        output = capture(monkeypatch)
+        handler = make_handler(logger, progress=True)
+        logger.info('hidden')
+        logger.warning('displayed')
+        handler.set_status('1/2', final=True)
+        handler.flush()
+        assert output.getvalue().splitlines() == ['WARNING displayed', '1/2']
+
+
+def test_buffered_logger_replay(logger, monkeypatch):
+    output = capture(monkeypatch)
+    handler = make_handler(logger)
+    buffered = BufferedLogger()
+    buffered.info('info %s', 1)
+    buffered.error('error')
+    assert output.getvalue() == ''
+    buffered.replay(logger)
+    handler.flush()
+    assert output.getvalue().splitlines() == ['INFO info 1', 'ERROR error']
+    assert buffered.records == []
+
+
+def test_cli_formatter():
+    formatter = CliFormatter()
+    record = logging.LogRecord('ucli', logging.ERROR, __file__, 1, 'failed %s', ('x',), None)
+    assert click.unstyle(formatter.format(record)) == 'error: failed x'
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from ucli.journal import Journal
+from ucli.plan import (
+    PLAN_VERSION, TRANSFERED, RESUMED, apply_plan, plan_entry, plan_header, read_plan, write_plan
+)
+
+
+def make_entries(count):
+    recipient = {'id': 'org', 'name': 'Organization'}
+    return [plan_entry(line, {'id': 'id{0}'.format(line), 'title': 'Dataset {0}'.format(line)},
+                       recipient)
+            for line in range(2, count + 2)]
+
+
+class TestPlanFile(object):
+    def test_round_trip(self, tmp_path):
+        path = str(tmp_path / 'plan.jsonl')
+        header = plan_header('Dataset', 'Organization', 'Moving', source='rows.csv')
+        entries = make_entries(5)
+        # Transfers are streamed
+        assert write_plan(path, header, iter(entries)) == 5
+        read_header, count, transfers = read_plan(path)
+        assert read_header == header
+        assert count == 5
+        assert list(transfers) == entries
+
+    def test_user_recipient_name(self):
+        entry = plan_entry(2, {'id': 'a'}, {'id': 'u', 'first_name': 'Jane', 'last_name': 'Doe'})
+        assert entry == {'line': 2, 'id': 'a', 'title': None, 'recipient': 'u', 'name': 'Jane Doe'}
+
+    def test_empty_plan(self, tmp_path):
+        path = str(tmp_path / 'plan.jsonl')
+        assert write_plan(path, plan_header('Reuse', 'User', None), []) == 0
+        header, count, transfers = read_plan(path)
+        assert header['subject'] == 'Reuse'
+        assert count == 0
+        assert list(transfers) == []
+
+    def test_not_a_plan(self, tmp_path):
+        path = tmp_path / 'rows.csv'
+        path.write_text('id,recipient\n')
+        with pytest.raises(SystemExit):
+            read_plan(str(path))
+
+    def test_unsupported_version(self, tmp_path):
+        path = tmp_path / 'plan.jsonl'
+        path.write_text(json.dumps({'plan': PLAN_VERSION + 1}) + '\n')
+        with pytest.raises(SystemExit):
+            read_plan(str(path))
+
+
+class TestApplyPlan(object):
+    def test_apply(self, api, udata, tmp_path):
+        org = udata.add_organization()
+        datasets = [udata.add_item() for _ in range(4)]
+        path = str(tmp_path / 'plan.jsonl')
+        write_plan(path, plan_header('Dataset', 'Organization', 'Moving'),
+                   (plan_entry(line, dataset, org) for line, dataset in enumerate(datasets, 2)))
+        header, count, transfers = read_plan(path)
+        with Journal(str(tmp_path / 'journal.jsonl')) as journal:
+            outcomes = apply_plan(api, header, transfers, journal, concurrency=2, total=count)
+        assert outcomes == {TRANSFERED: 4}
+        assert all(dataset['organization']['id'] == org['id'] for dataset in datasets)
+
+        # Applying again with the same journal resumes everything
+        header, count, transfers = read_plan(path)
+        with Journal(str(tmp_path / 'journal.jsonl')) as journal:
+            outcomes = apply_plan(api, header, transfers, journal, total=count)
+        assert outcomes == {RESUMED: 4}
+        assert len(udata.transfers) == 4
@@ -0,0 +1,92 @@
+import logging
+
+import pytest
+
+from ucli import progress as progress_module
+from ucli.progress import Progress
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.
+
+    def __call__(self):
+        return self.now
+
+
+class StatusRecorder(object):
+    '''Record the status lines like the progress mode log handler'''
+    def __init__(self):
+        self.statuses = []
+
+    def set_status(self, text, final=False):
+        self.statuses.append((text, final))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(progress_module.time, 'monotonic', clock)
+    return clock
+
+
+def test_known_total(clock):
+    progress = Progress(100, unit='datasets')
+    clock.now += 10
+    progress.advance(20)
+    assert progress.status() == '20/100 (20.0%) - 2.0 datasets/s - ETA 0:00:40'
+    progress.advance(80)
+    assert progress.status() == '100/100 (100.0%) - 10.0 datasets/s'
+
+
+def test_unknown_total(clock):
+    progress = Progress(unit='rows')
+    clock.now += 4
+    progress.advance(10)
+    assert progress.eta is None
+    assert progress.status() == '10 - 2.5 rows/s'
+    assert progress.progress_bar() == progress.status()
+
+
+def test_failures(clock):
+    progress = Progress(4)
+    clock.now += 1
+    progress.advance()
+    progress.advance(failed=True)
+    progress.advance(2, failed=True)
+    assert (progress.done, progress.failed) == (4, 3)
+    assert progress.status() == '4/4 (100.0%) - 3 failed - 4.0 items/s'
+
+
+def test_no_rate_before_any_time(clock):
+    progress = Progress(10)
+    progress.advance()
+    assert progress.rate == 0.
+    assert progress.eta is None
+
+
+def test_periodic_reports(clock, caplog):
+    caplog.set_level(logging.INFO, 'ucli.progress')
+    progress = Progress(10, interval=5)
+    clock.now += 1
+    progress.advance()
+    assert not caplog.records
+    clock.now += 5
+    progress.advance()
+    assert [r.getMessage() for r in caplog.records] == [
+        'Progress: 2/10 (20.0%) - 0.3 items/s - ETA 0:00:24']
+    progress.summary()
+    assert caplog.records[-1].getMessage() == 'Processed 2 items in 0:00:06 (0.3 items/s)'
+
+
+def test_progress_bar(clock):
+    progress = Progress(4)
+    progress.bar = StatusRecorder()
+    clock.now += 1
+    progress.advance()
+    progress.advance(3, failed=True)
+    progress.summary()
+    bars = [text for text, _ in progress.bar.statuses]
+    assert bars[0].startswith('[' + '#' * 7 + '.' * 23 + '] 1/4 (25.0%)')
+    assert bars[1].startswith('[' + '#' * 30 + '] 4/4 (100.0%) - 3 failed')
+    assert progress.bar.statuses[-1][1]  # Kept as a regular line
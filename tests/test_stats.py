@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from ucli.stats import Stats, endpoint_template, percentile
+
+ROOT = 'https://www.data.gouv.fr/api/1/'
+
+
+@pytest.mark.parametrize('path,template', [
+    ('site/', 'site/'),
+    ('datasets/', 'datasets/'),
+    ('datasets/?page=2&page_size=20', 'datasets/'),
+    ('datasets/5f0c8e6a1d0b7d0cf1e2a3b4/', 'datasets/{id}/'),
+    ('datasets/my-slug/', 'datasets/{id}/'),
+    ('datasets/suggest/', 'datasets/suggest/'),
+    ('datasets/my-slug/resources/2b6f4a0e-8d3c-4e5f-9a1b-0c2d3e4f5a6b/',
+     'datasets/{id}/resources/{id}/'),
+    ('transfer/42/', 'transfer/{id}/'),
+])
+def test_endpoint_template(path, template):
+    assert endpoint_template(ROOT + path, ROOT) == template
+
+
+@pytest.mark.parametrize('values,p,expected', [
+    ([], 50, None),
+    ([7], 99, 7),
+    ([1, 2], 50, 1),
+    ([1, 2, 3, 4, 5, 6], 50, 3),
+    ([1, 2, 3, 4, 5], 50, 3),
+    (list(range(1, 21)), 95, 19),
+    (list(range(1, 101)), 99, 99),
+    (list(range(1, 101)), 100, 100),
+    (list(range(1, 101)), 0, 1),
+])
+def test_percentile(values, p, expected):
+    assert percentile(values, p) == expected
+
+
+class TestStats(object):
+    def test_calls_are_aggregated_per_endpoint(self, tmp_path):
+        stats = Stats(ROOT)
+        stats.record('GET', ROOT + 'datasets/abc/', 200, .1, bytes_in=100, bytes_wire=40)
+        stats.record('GET', ROOT + 'datasets/def/', 404, .3, bytes_in=10)
+        stats.record('POST', ROOT + 'transfer/', None)
+        assert stats.totals() == (3, 2)
+        filename = str(tmp_path / 'stats.json')
+        stats.export(filename)
+        with open(filename) as f:
+            data = json.load(f)
+        assert data == stats.as_dict()
+        assert sorted(data['endpoints']) == ['GET datasets/{id}/', 'POST transfer/']
+        assert 'http_cache' not in data
+        endpoint = data['endpoints']['GET datasets/{id}/']
+        assert endpoint['calls'] == 2
+        assert endpoint['errors'] == 1
+        assert endpoint['bytes_in'] == 110
+        assert endpoint['bytes_wire'] == 50
@@ -0,0 +1,75 @@
+import pytest
+
+from ucli import suggest
+from ucli.api import Api
+from ucli.index import open_index
+from ucli.suggest import SuggestCache, matches
+
+
+def test_matches():
+    result = {'id': 'abc', 'name': 'Ministère de la Culture', 'page': 1}
+    assert matches(result, 'culture')
+    assert matches(result, 'ministere CULT')
+    assert not matches(result, 'culture sport')
+
+
+class TestSuggestCache(object):
+    def test_expired(self):
+        cache = SuggestCache(ttl=-1)
+        cache.set('organizations/suggest/', 'min', 10, [])
+        assert cache.lookup('organizations/suggest/', 'min', 10) is None
+
+    def test_longer_query_narrowed_locally(self):
+        cache = SuggestCache()
+        results = [{'name': 'Ministère de la Culture'}, {'name': 'Ministère des Sports'}]
+        cache.set('organizations/suggest/', 'min', 10, results)
+        assert cache.lookup('organizations/suggest/', 'mini sport', 10) == results[1:]
+        assert cache.lookup('organizations/suggest/', 'mx', 10) is None
+
+    def test_truncated_results_not_narrowed(self):
+        cache = SuggestCache()
+        cache.set('organizations/suggest/', 'min', 2, [{'name': 'Min 1'}, {'name': 'Min 2'}])
+        # The shorter query results may miss matches of the longer one
+        assert cache.lookup('organizations/suggest/', 'min 3', 2) is None
+
+
+class TestFetch(object):
+    @pytest.fixture
+    def make_api(self, server, tmp_path):
+        def make_api(**options):
+            return Api(server.url, 'token', cache_dir=str(tmp_path), **options)
+        return make_api
+
+    def test_narrowed_without_request(self, make_api, udata):
+        api = make_api()
+        udata.add_organization('Culture')
+        udata.add_organization('Sports')
+        udata.add_organization('Culture et Sports')
+        assert len(suggest.fetch(api, 'organizations/suggest/', 'cult')) == 2
+        assert udata.requests == 1
+        results = suggest.fetch(api, 'organizations/suggest/', 'culture et')
+        assert [r['name'] for r in results] == ['Culture et Sports']
+        assert udata.requests == 1
+
+    def test_cache_disabled(self, make_api, udata):
+        api = make_api(suggest_ttl=0)
+        udata.add_organization('Culture')
+        suggest.fetch(api, 'organizations/suggest/', 'cult')
+        suggest.fetch(api, 'organizations/suggest/', 'cult')
+        assert udata.requests == 2
+
+    def test_index_then_cache(self, make_api, udata):
+        api = make_api(index=True)
+        org = udata.add_organization('Culture')
+        open_index(api).sync(api, 'organizations')
+        requests = udata.requests
+        # Indexed, the API is never called
+        assert [r['id'] for r in suggest.fetch(api, 'organizations/suggest/', 'cult')] == [
+            org['id']]
+        assert udata.requests == requests
+        # Not indexed yet, fetched then cached
+        udata.add_organization('Sports')
+        assert len(suggest.fetch(api, 'organizations/suggest/', 'sport')) == 1
+        assert udata.requests == requests + 1
+        assert len(suggest.fetch(api, 'organizations/suggest/', 'sport')) == 1
+        assert udata.requests == requests + 1
@@ -0,0 +1,115 @@
+import threading
+import time
+
+from email.utils import formatdate
+
+import pytest
+
+from ucli.throttle import AdaptiveLimiter, TokenBucket, parse_retry_after
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('') is None
+    assert parse_retry_after('3') == 3.
+    assert parse_retry_after('-1') == 0.
+    assert parse_retry_after('not a date') is None
+    assert parse_retry_after(formatdate(time.time() - 60, usegmt=True)) == 0.
+    assert 55 < parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
+
+
+class TestTokenBucket(object):
+    def test_burst_is_immediate(self):
+        bucket = TokenBucket(1, burst=5)
+        start = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        assert time.monotonic() - start < .1
+
+    def test_rate_is_enforced_once_burst_is_consumed(self):
+        bucket = TokenBucket(50, burst=1)
+        start = time.monotonic()
+        for _ in range(11):
+            bucket.acquire()
+        # The first token is available, the 10 following ones take 1/50s each
+        assert time.monotonic() - start == pytest.approx(.2, abs=.1)
+
+    def test_burst_defaults_to_rate(self):
+        assert TokenBucket(10).capacity == 10
+        assert TokenBucket(.5).capacity == 1
+
+
+class TestAdaptiveLimiter(object):
+    def test_starts_at_half_the_max(self):
+        assert AdaptiveLimiter(8).limit == 4
+        assert AdaptiveLimiter(1).limit == 1
+
+    def test_halved_on_overload(self):
+        limiter = AdaptiveLimiter(16, min_limit=2)
+        for status, limit in ((429, 4), (503, 2), (429, 2)):
+            limiter.acquire()
+            limiter.release(status)
+            assert limiter.limit == limit
+
+    def test_grows_while_healthy(self):
+        limiter = AdaptiveLimiter(6)
+        for _ in range(3 + 4):
+            limiter.acquire()
+            limiter.release(200, .1)
+        assert limiter.limit == 5
+
+    def test_capped_to_max(self):
+        limiter = AdaptiveLimiter(2)
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(200, .1)
+        assert limiter.limit == 2
+
+    def test_shrinks_on_degraded_latency(self):
+        limiter = AdaptiveLimiter(8)
+        limiter.acquire()
+        limiter.release(200, .1)
+        limiter.acquire()
+        limiter.release(200, 10)
+        assert limiter.limit == 3
+
+    def test_server_errors_are_ignored(self):
+        limiter = AdaptiveLimiter(8)
+        limiter.acquire()
+        limiter.release(500, 10)
+        limiter.acquire()
+        limiter.release()
+        assert limiter.limit == 4
+        assert limiter.latencies == {}
+
+    def test_latency_is_compared_per_endpoint(self):
+        limiter = AdaptiveLimiter(8)
+        for _ in range(3):
+            for endpoint, latency in (('GET site/', .01), ('GET datasets/', 1)):
+                limiter.acquire()
+                limiter.release(200, latency, endpoint=endpoint)
+        # 6 healthy responses: a slow endpoint is not a degraded fast one
+        assert limiter.limit == 5
+        limiter.acquire()
+        limiter.release(200, 10, endpoint='GET datasets/')
+        assert limiter.limit == 4
+        assert limiter.best_latencies == {'GET site/': .01, 'GET datasets/': 1}
+
+    def test_blocks_at_limit(self):
+        limiter = AdaptiveLimiter(2)
+        limiter.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+        thread.start()
+        assert not acquired.wait(.1)
+        limiter.release(200, .1)
+        assert acquired.wait(1)
+        thread.join()
+
+    def test_paused_on_retry_after(self):
+        limiter = AdaptiveLimiter(8)
+        limiter.acquire()
+        limiter.release(429, retry_after=.2)
+        start = time.monotonic()
+        limiter.acquire()
+        assert time.monotonic() - start >= .15
@@ -0,0 +1,26 @@
+import requests
+
+from ucli.api import Api
+
+
+def test_network_failures_only_fail_their_item(ucli, udata, monkeypatch):
+    datasets = [udata.add_item(owner={'id': udata.me['id']}) for _ in range(4)]
+    org = udata.add_organization('Recipient')
+    failing = datasets[1]['id']
+    send = Api.send
+
+    def unreachable_for_one_item(api, method, url, **kwargs):
+        if method == 'POST' and failing in str(kwargs.get('json')):
+            raise requests.exceptions.ReadTimeout('Injected timeout')
+        return send(api, method, url, **kwargs)
+    monkeypatch.setattr(Api, 'send', unreachable_for_one_item)
+    # Datasets, from mine, to an organization, its query and choice, the reason, confirmation
+    answers = ['1', '1', '2', 'Recipient', '1', 'Reason', 'y']
+    result = ucli('--retries', '0', 'transfer', '--concurrency', '2',
+                  input='\n'.join(answers) + '\n')
+    assert result.exit_code == 0, result.output
+    assert 'network error' in result.output
+    assert '1 item(s) could not be transfered' in result.output
+    assert 'Transfered 3 item(s)' in result.output
+    owned = {d['id'] for d in datasets if (d['organization'] or {}).get('id') == org['id']}
+    assert owned == {d['id'] for d in datasets} - {failing}
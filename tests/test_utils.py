@@ -0,0 +1,61 @@
+import csv
+import io
+
+import pytest
+
+from ucli.utils import count_rows, instance_path
+
+
+class Semicolon(csv.excel):
+    delimiter = ';'
+
+
+class Unseekable(io.StringIO):
+    '''A text stream which cannot be rewound, like stdin'''
+    def seekable(self):
+        return False
+
+
+@pytest.mark.parametrize('content,count', [
+    ('', 0),
+    ('dataset,organization\n', 0),
+    ('dataset,organization', 0),
+    ('dataset,organization\na,1\nb,2\n', 2),
+    ('dataset,organization\na,1\nb,2', 2),
+    ('dataset,organization\n\na,1\n\n\nb,2\n\n', 2),
+    ('\ndataset,organization\na,1\n', 1),
+    # A quoted cell spanning several lines is a single row
+    ('dataset,comment\na,"first line\nsecond line"\nb,x\n', 2),
+])
+def test_count_rows(content, count):
+    file = io.StringIO(content)
+    file.read(3)
+    assert count_rows(file) == count
+    assert file.tell() == 0  # Rewound for the actual processing
+
+
+def test_count_rows_dialect():
+    content = 'dataset;organization\na;"1\n2"\n'
+    # The quoted line break is only seen with the right delimiter
+    assert count_rows(io.StringIO(content)) == 2
+    assert count_rows(io.StringIO(content), dialect=Semicolon) == 1
+
+
+def test_count_rows_unseekable():
+    file = Unseekable('dataset,organization\na,1\n')
+    assert count_rows(file) is None
+    assert file.read() == 'dataset,organization\na,1\n'  # Left unread
+
+
+@pytest.mark.parametrize('path,name,expected', [
+    ('plan.jsonl', 'prod', 'plan.prod.jsonl'),
+    ('out/datasets.csv.gz', 'prod', 'out/datasets.prod.csv.gz'),
+    ('journal', 'prod', 'journal.prod'),
+    ('.journal', 'prod', '.journal.prod'),
+    ('dir.d/.plan.jsonl', 'prod', 'dir.d/.plan.prod.jsonl'),
+    ('plan.jsonl', 'www.data.gouv.fr', 'plan.www-data-gouv-fr.jsonl'),
+    ('plan.jsonl', '../../etc/passwd', 'plan.etc-passwd.jsonl'),
+    ('plan.jsonl', 'localhost:7000', 'plan.localhost-7000.jsonl'),
+])
+def test_instance_path(path, name, expected):
+    assert instance_path(path, name) == expected
@@ -0,0 +1,242 @@
+'''
+An asyncio flavour of the UData API client.
+
+`AsyncApi` shares the `Api` settings and policies: retries, rate limiting,
+adaptive concurrency, HTTP cache and statistics. A single thread can then keep
+thousands of requests in flight. It requires the optional ``aiohttp`` dependency
+(``pip install udata-cli[async]``).
+'''
+import asyncio
+import logging
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from . import jsonlib
+from .api import Api, DEFAULT_PAGE_SIZE, IDEMPOTENT_METHODS, RETRY_STATUSES, UNPROCESSED_STATUSES
+from .stats import endpoint_key
+from .throttle import parse_retry_after
+from .trace import span
+from .utils import exit
+
+log = logging.getLogger(__name__)
+
+
+def is_unsent(error):
+    '''Wether a request error occured before the request has been sent'''
+    connect_errors = (aiohttp.ClientConnectorError, getattr(aiohttp, 'ConnectionTimeoutError', ()))
+    return isinstance(error, connect_errors)
+
+
+class Response(object):
+    '''
+    A fully read ``aiohttp`` response exposing the subset
+    of the ``requests.Response`` interface used by ucli.
+    '''
+    def __init__(self, url, status_code, reason, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode('utf8')
+
+    def json(self):
+        return jsonlib.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            kind = 'Client' if self.status_code < 500 else 'Server'
+            msg = '{0} {1} Error: {2} for url: {3}'.format(
+                self.status_code, kind, self.reason, self.url)
+            raise Api.HTTPError(msg, response=self)
+
+
+class AsyncApi(Api):
+    '''
+    UData API asyncio client
+
+    Same interface and options as `Api` except that verbs are coroutines.
+    The underlying ``aiohttp`` session is bound to the running loop,
+    so it is created on first use and must be released with `close`.
+    '''
+    RequestException = (aiohttp.ClientError, asyncio.TimeoutError) if aiohttp else ()
+
+    def __init__(self, root, token, **kwargs):
+        if aiohttp is None:
+            exit('The asyncio client requires aiohttp',
+                 'Install it with: pip install udata-cli[async]')
+        super(AsyncApi, self).__init__(root, token, **kwargs)
+        self._released = None
+
+    @property
+    def session(self):
+        '''
+        The ``aiohttp`` session, created on first use. Connections are not capped,
+        the number of in-flight requests being bounded by the callers (and `--adaptive`).
+        '''
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=0, force_close=not self.keep_alive,
+                                             ssl=None if self.ssl_check else False)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    @property
+    def released(self):
+        '''Notified each time an adaptive limiter slot is released'''
+        if self._released is None:
+            self._released = asyncio.Condition()
+        return self._released
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def request(self, method, path, idempotent=None, **kwargs):
+        '''The asyncio counterpart of `Api.request`, with the same retry policy'''
+        url = self.url(path)
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await self.send(method, url, **kwargs)
+            except self.RequestException as e:
+                if attempt > self.retries or not (idempotent or is_unsent(e)):
+                    exit(e)
+                await asyncio.sleep(self.retry_delay(attempt, method, url, e))
+                continue
+            status = response.status_code
+            retryable = status in RETRY_STATUSES if idempotent else status in UNPROCESSED_STATUSES
+            if not retryable or attempt > self.retries:
+                return response
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            await asyncio.sleep(self.retry_delay(attempt, method, url, status, retry_after))
+
+    async def acquire(self):
+        '''Wait for the rate and adaptive limiters if enabled, without blocking the loop'''
+        if self.rate_limiter:
+            while True:
+                wait = self.rate_limiter.try_acquire()
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+        if self.limiter:
+            async with self.released:
+                while True:
+                    wait = self.limiter.try_acquire()
+                    if wait == 0:
+                        return
+                    try:
+                        await asyncio.wait_for(self.released.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass  # Paused by a Retry-After
+
+    async def release(self, status, latency, retry_after, endpoint):
+        self.limiter.release(status, latency, retry_after, endpoint)
+        async with self.released:
+            self.released.notify_all()
+
+    async def send(self, method, url, params=None, json=None, **kwargs):
+        '''Send a single request and read its body, throttled like `Api.send`'''
+        if params:
+            params = {k: str(v) for k, v in params.items()}
+        body = jsonlib.dumps(json).encode('utf8') if json is not None else b''
+        await self.acquire()
+        status = retry_after = response = None
+        start = time.monotonic()
+        try:
+            with span(method, 'api', url=url) as args:
+                async with self.session.request(method, url, params=params, data=body or None,
+                                                **kwargs) as r:
+                    content = await r.read()
+                response = Response(str(r.url), r.status, r.reason, r.headers, content)
+                status = args['status'] = response.status_code
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            return response
+        finally:
+            latency = time.monotonic() - start
+            if self.limiter:
+                await self.release(status, latency, retry_after,
+                                   endpoint_key(method, url, self.root))
+            if self.stats:
+                self.record_stats(method, url, response, latency, len(body))
+
+    def record_stats(self, method, url, response, latency, bytes_out=0):
+        if response is None:
+            self.stats.record(method, url, latency=latency)
+            return
+        bytes_in = len(response.content)
+        # Bytes actually received, before content decoding
+        bytes_wire = int(response.headers.get('Content-Length') or bytes_in)
+        self.stats.record(method, url, response.status_code, latency, bytes_in, bytes_out,
+                          bytes_wire)
+
+    async def get(self, path, headers=None, fields=None, allow_failure=False, **params):
+        headers = headers or {}
+        if fields:
+            headers['X-Fields'] = fields
+        headers = self.headers(**headers)
+        if self.http_cache:
+            url = self.url(path)
+            key, entry, response = self.http_cache.prepare(url, params, headers)
+            if response is None:
+                response = await self.request('GET', path, params=params, headers=headers)
+                response = self.http_cache.update(url, key, entry, response)
+        else:
+            response = await self.request('GET', path, params=params, headers=headers)
+        return self.check(response, allow_failure=allow_failure)
+
+    async def post(self, path, data, headers=None, fields=None, allow_failure=False,
+                   idempotent=False):
+        headers = headers or {}
+        if fields:
+            headers['X-Fields'] = fields
+        headers = self.headers(**headers)
+        response = await self.request('POST', path, json=data, headers=headers,
+                                      idempotent=idempotent)
+        return self.check(response, allow_failure=allow_failure)
+
+    async def put(self, path, data, headers=None, fields=None, allow_failure=False):
+        headers = headers or {}
+        if fields:
+            headers['X-Fields'] = fields
+        headers = self.headers(**headers)
+        response = await self.request('PUT', path, headers=headers, json=data)
+        return self.check(response, allow_failure=allow_failure)
+
+    async def delete(self, path, allow_failure=False):
+        headers = self.headers()
+        response = await self.request('DELETE', path, headers=headers)
+        return self.check(response, raw=True, allow_failure=allow_failure)
+
+    async def paginate(self, path, fields=None, page_size=DEFAULT_PAGE_SIZE, **params):
+        '''Asynchronously iterate over all the items of a paginated list endpoint'''
+        fields = 'data{{{0}}},next_page,total'.format(fields) if fields else None
+        url, params = path, dict(params, page_size=page_size)
+        while url:
+            page = await self.get(url, fields=fields, **params)
+            for item in page['data']:
+                yield item
+            url, params = page.get('next_page') if page['data'] else None, {}
+
+    def iter_items(self, *args, **kwargs):
+        raise NotImplementedError('Pages are not parsed incrementally by the asyncio client')
@@ -1,21 +1,69 @@
+import hashlib
+import importlib.util
 import logging
+import os
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 
-import click
 import requests
 
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from . import jsonlib
+from .cache import cache_dir, DEFAULT_DISK_CACHE_SIZE
+from .httpcache import HttpCache
+from .stats import Stats, endpoint_key
+from .trace import span
+from .throttle import AdaptiveLimiter, TokenBucket, parse_retry_after
 from .utils import exit
 
 log = logging.getLogger(__name__)
 
 
+DEFAULT_POOL_SIZE = 10
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = .5
+MAX_BACKOFF = 60
+
+#: Methods which can safely be sent twice
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+#: Statuses worth a retry on idempotent requests
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+#: Statuses ensuring the request has not been processed, worth a retry on any request
+UNPROCESSED_STATUSES = (429,)
+
+#: Content encodings both HTTP clients can decode, brotli requiring an optional dependency
+ACCEPT_ENCODING = ', '.join(['gzip', 'deflate'] + [
+    'br' for module in ('brotli', 'brotlicffi') if importlib.util.find_spec(module)
+][:1])
+
+
+def is_unsent(error):
+    '''Wether a request error occured before the request has been sent'''
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        reason = getattr(error.args[0], 'reason', None)
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
 class Api(object):
     '''UData API client'''
 
     HTTPError = requests.HTTPError  # For easy access
+    RequestException = requests.exceptions.RequestException
 
     DEFAULT_HEADERS = {
         'User-Agent': 'ucli',
         'Content-Type': 'application/json',
+        'Accept-Encoding': ACCEPT_ENCODING,
     }
 
     def __init__(self, root, token, **kwargs):
@@ -25,14 +73,40 @@ class Api(object):
         if not self.root.endswith('api/1/'):
             self.root += 'api/1/'
         self.token = token
+        self.options = kwargs
         self.ssl_check = kwargs.get('ssl_check', True)
+        self.pool_size = kwargs.get('pool_size') or DEFAULT_POOL_SIZE
+        self.pool_maxsize = kwargs.get('pool_maxsize') or DEFAULT_POOL_MAXSIZE
+        self.keep_alive = kwargs.get('keep_alive', True)
         # Disable the urllib3 warning
         if not self.ssl_check:
             try:
                 import requests.packages.urllib3
                 requests.packages.urllib3.disable_warnings()
-            except:
+            except Exception:
                 pass
+        self._session = None
+        self._session_lock = threading.Lock()
+        rate_limit = kwargs.get('rate_limit')
+        self.rate_limiter = TokenBucket(rate_limit) if rate_limit else None
+        self.limiter = AdaptiveLimiter(self.pool_maxsize) if kwargs.get('adaptive') else None
+        retries = kwargs.get('retries')
+        self.retries = DEFAULT_RETRIES if retries is None else retries
+        backoff = kwargs.get('backoff')
+        self.backoff = DEFAULT_BACKOFF if backoff is None else backoff
+        self.cache_dir = kwargs.get('cache_dir') or cache_dir()
+        self.http_cache = None
+        if kwargs.get('http_cache'):
+            path = os.path.join(self.cache_dir, 'http', self.cache_namespace)
+            max_size = (kwargs.get('http_cache_size') or DEFAULT_DISK_CACHE_SIZE) * 1024 * 1024
+            self.http_cache = HttpCache(path, max_size)
+        self.stats = Stats(self.root, http_cache=self.http_cache) if kwargs.get('stats') else None
+
+    @property
+    def cache_namespace(self):
+        '''An identifier of the instance and token pair used to isolate local caches'''
+        key = '\0'.join((self.root, self.token or ''))
+        return hashlib.sha256(key.encode('utf8')).hexdigest()[:16]
 
     def headers(self, **kwargs):
         headers = self.DEFAULT_HEADERS.copy()
@@ -42,6 +116,8 @@ class Api(object):
         return headers
 
     def url(self, path):
+        if path.startswith(('http://', 'https://')):
+            return path  # Already absolute (ie. a ``next_page`` link)
         return ''.join((self.root, path))
 
     def check(self, response, raw=False, allow_failure=False):
@@ -49,38 +125,166 @@ class Api(object):
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
             try:
-                details = response.json()['message']
-            except:
+                details = jsonlib.loads(response.content)['message']
+            except Exception:  # Not a JSON error payload
                 details = None
             if allow_failure:
                 response.error_details = details
                 return response
             else:
                 exit(e, details)
-        return response if raw else response.json()
+        if raw:
+            return response
+        with span('decode JSON', 'client', bytes=len(response.content)):
+            return jsonlib.loads(response.content)
+
+    def create_session(self):
+        '''
+        Create the long-lived HTTP session shared by all calls.
+
+        ``pool_size`` is the number of distinct hosts kept in the pool
+        and ``pool_maxsize`` the number of connections kept per host.
+        '''
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size,
+                              pool_maxsize=self.pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.verify = self.ssl_check
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    @property
+    def session(self):
+        '''The HTTP session, created on first use'''
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self.create_session()
+        return self._session
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+    def request(self, method, path, idempotent=None, **kwargs):
+        '''
+        Perform a request using the shared session.
+
+        Network errors and transient failure statuses are retried up to ``retries`` times
+        with an exponential backoff, unless the request is not idempotent and may have
+        been processed (``idempotent`` defaults to the method idempotency).
+        Still failing network errors exit.
+        '''
+        url = self.url(path)
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self.send(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if attempt > self.retries or not (idempotent or is_unsent(e)):
+                    exit(e)
+                self.wait_before_retry(attempt, method, url, e)
+                continue
+            status = response.status_code
+            retryable = status in RETRY_STATUSES if idempotent else status in UNPROCESSED_STATUSES
+            if not retryable or attempt > self.retries:
+                return response
+            response.close()
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            self.wait_before_retry(attempt, method, url, status, retry_after)
+
+    def wait_before_retry(self, attempt, method, url, reason, retry_after=None):
+        time.sleep(self.retry_delay(attempt, method, url, reason, retry_after))
+
+    def retry_delay(self, attempt, method, url, reason, retry_after=None):
+        '''
+        An exponential delay with full jitter before retrying,
+        or the server ``Retry-After`` delay if longer.
+        '''
+        delay = random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** (attempt - 1)))
+        if retry_after:
+            delay = max(delay, retry_after)
+        log.warning('%s %s failed (%s), retrying in %.1fs (%s/%s)',
+                    method, url, reason, delay, attempt, self.retries)
+        return delay
+
+    def send(self, method, url, **kwargs):
+        '''Send a single request, throttled by the rate and adaptive limiters if enabled'''
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        if self.limiter:
+            self.limiter.acquire()
+        status = retry_after = response = None
+        start = time.monotonic()
+        try:
+            with span(method, 'api', url=url) as args:
+                response = self.session.request(method, url, **kwargs)
+                status = args['status'] = response.status_code
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            return response
+        finally:
+            latency = time.monotonic() - start
+            if self.limiter:
+                self.limiter.release(status, latency, retry_after,
+                                     endpoint_key(method, url, self.root))
+            if self.stats:
+                self.record_stats(method, url, response, latency, stream=kwargs.get('stream'))
+
+    def record_stats(self, method, url, response, latency, stream=False):
+        if response is None:
+            self.stats.record(method, url, latency=latency)
+            return
+        body = response.request.body or b''
+        if stream:  # Don't consume a streamed body
+            bytes_in = bytes_wire = int(response.headers.get('Content-Length') or 0)
+        else:
+            bytes_in = len(response.content)
+            # Bytes actually received, before content decoding
+            bytes_wire = response.raw.tell() if hasattr(response.raw, 'tell') else bytes_in
+        self.stats.record(method, url, response.status_code, latency, bytes_in, len(body),
+                          bytes_wire)
 
     def get(self, path, headers=None, fields=None, allow_failure=False, **params):
         headers = headers or {}
         if fields:
             headers['X-Fields'] = fields
         headers = self.headers(**headers)
-        url = self.url(path)
-        try:
-            response = requests.get(url, params=params, headers=headers, verify=self.ssl_check)
-        except requests.exceptions.RequestException as e:
-            exit(e)
+        if self.http_cache:
+            response = self.http_cache.get(self, path, params=params, headers=headers)
+        else:
+            response = self.request('GET', path, params=params, headers=headers)
         return self.check(response, allow_failure=allow_failure)
 
-    def post(self, path, data, headers=None, fields=None, allow_failure=False):
+    def iter_items(self, path, meta, headers=None, fields=None, **params):
+        '''
+        Stream a list page, yielding its items while it is still being downloaded.
+
+        Page scalars (``total``, ``next_page``...) are stored into ``meta``.
+        It requires the optional ``ijson`` dependency, see `jsonlib.INCREMENTAL`.
+        '''
         headers = headers or {}
         if fields:
             headers['X-Fields'] = fields
         headers = self.headers(**headers)
-        url = self.url(path)
-        try:
-            response = requests.post(url, json=data, headers=headers, verify=self.ssl_check)
-        except requests.exceptions.RequestException as e:
-            exit(e)
+        response = self.request('GET', path, params=params, headers=headers, stream=True)
+        response = self.check(response, raw=True)
+        with response:
+            response.raw.decode_content = True
+            with span('decode JSON', 'client', stream=True):
+                for item in jsonlib.iter_items(response.raw, meta):
+                    yield item
+
+    def post(self, path, data, headers=None, fields=None, allow_failure=False, idempotent=False):
+        headers = headers or {}
+        if fields:
+            headers['X-Fields'] = fields
+        headers = self.headers(**headers)
+        response = self.request('POST', path, json=data, headers=headers, idempotent=idempotent)
         return self.check(response, allow_failure=allow_failure)
 
     def put(self, path, data, headers=None, fields=None, allow_failure=False):
@@ -88,21 +292,103 @@ class Api(object):
         if fields:
             headers['X-Fields'] = fields
         headers = self.headers(**headers)
-        url = self.url(path)
-        try:
-            response = requests.put(url, headers=headers, json=data, verify=self.ssl_check)
-        except requests.exceptions.RequestException as e:
-            exit(e)
+        response = self.request('PUT', path, headers=headers, json=data)
         return self.check(response, allow_failure=allow_failure)
 
     def delete(self, path, allow_failure=False):
         headers = self.headers()
-        url = self.url(path)
-        try:
-            response = requests.delete(url, headers=headers, verify=self.ssl_check)
-        except requests.exceptions.RequestException as e:
-            exit(e)
+        response = self.request('DELETE', path, headers=headers)
         return self.check(response, raw=True, allow_failure=allow_failure)
 
+    def paginate(self, path, fields=None, page_size=DEFAULT_PAGE_SIZE, prefetch=False, stream=False,
+                 **params):
+        '''Lazily iterate over all the items of a paginated list endpoint'''
+        return Paginator(self, path, fields=fields, page_size=page_size, prefetch=prefetch,
+                         stream=stream, **params)
+
+
+class Paginator(object):
+    '''
+    Iterate over the items of a paginated list endpoint, page by page.
+
+    Pages are fetched on demand by following their ``next_page`` link so
+    only one page (two with ``prefetch``) is held in memory at a time.
+    With ``prefetch``, the next page is fetched in background while the
+    current one is consumed.
+
+    With ``stream``, pages are parsed incrementally and items are yielded
+    while their page is still being downloaded (this requires ``ijson``
+    and is disabled when the HTTP cache is, both needing the full body).
+
+    ``fields`` is the item fields projection, ``total`` is available
+    as soon as the first page has been fetched.
+    '''
+    def __init__(self, api, path, fields=None, page_size=DEFAULT_PAGE_SIZE, prefetch=False,
+                 stream=False, **params):
+        self.api = api
+        self.path = path
+        self.fields = 'data{{{0}}},next_page,total'.format(fields) if fields else None
+        self.params = dict(params, page_size=page_size)
+        self.prefetch = prefetch
+        self.stream = stream and jsonlib.INCREMENTAL and not getattr(api, 'http_cache', None)
+        self._first_page = None
+        self._total = None
+
+    def fetch(self, url, **params):
+        return self.api.get(url, fields=self.fields, **params)
+
+    def first_page(self):
+        if self._first_page is None:
+            self._first_page = self.fetch(self.path, **self.params)
+            self._total = self._first_page['total']
+        return self._first_page
+
+    @property
+    def total(self):
+        if self._total is None:
+            self.first_page()
+        return self._total
+
+    def pages(self):
+        page = self.first_page()
+        self._first_page = None  # Don't keep it around once consumed
+        if not self.prefetch:
+            while page:
+                yield page
+                page = self.fetch(page['next_page']) if page.get('next_page') else None
+            return
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            while page:
+                next_page = page.get('next_page')
+                future = executor.submit(self.fetch, next_page) if next_page else None
+                yield page
+                page = future.result() if future else None
+
+    def streamed(self):
+        '''Iterate over items, parsing each page while it is downloaded'''
+        url, params = self.path, self.params
+        if self._first_page is not None:  # Already fetched to get the total
+            page, self._first_page = self._first_page, None
+            for item in page['data']:
+                yield item
+            url, params = page.get('next_page') if page['data'] else None, {}
+        while url:
+            meta = {}
+            count = 0
+            for item in self.api.iter_items(url, meta, fields=self.fields, **params):
+                count += 1
+                yield item
+            if 'total' in meta:
+                self._total = meta['total']
+            url, params = meta.get('next_page') if count else None, {}
 
-pass_api = click.make_pass_decorator(Api)
+    def __iter__(self):
+        if self.stream:
+            for item in self.streamed():
+                yield item
+            return
+        for page in self.pages():
+            if not page['data']:
+                break
+            for item in page['data']:
+                yield item
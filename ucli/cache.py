@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = 1000
+
+#: Default on-disk caches size in megabytes
+DEFAULT_DISK_CACHE_SIZE = 100
+
+MISSING = object()
+
+
+class LRUCache(object):
+    '''
+    A thread-safe size-bounded mapping evicting the least recently used keys.
+
+    Lookups are counted as ``hits`` and ``misses``.
+    '''
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+
+class CachedGetter(object):
+    '''
+    Memoize ``api.get(path, fields=fields, allow_failure=True)`` lookups.
+
+    Successful responses are cached as well as 404 failures (negative caching).
+    Any other failure is considered transient and is not cached.
+    '''
+    def __init__(self, api, maxsize=DEFAULT_CACHE_SIZE):
+        self.api = api
+        self.cache = LRUCache(maxsize)
+
+    def get(self, path, fields=None):
+        key = (path, fields)
+        result = self.cache.get(key, MISSING)
+        if result is MISSING:
+            result = self.api.get(path, fields=fields, allow_failure=True)
+            if not hasattr(result, 'error_details') or result.status_code == 404:
+                self.cache.set(key, result)
+        return result
+
+    def discard(self, path, fields=None):
+        self.cache.discard((path, fields))
+
+    @property
+    def hits(self):
+        return self.cache.hits
+
+    @property
+    def misses(self):
+        return self.cache.misses
+
+
+def cache_dir():
+    '''The ucli cache directory, following the platform conventions'''
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'ucli')
+
+
+class DiskCache(object):
+    '''
+    A size-bounded on-disk store of JSON serializable values.
+
+    Each entry is stored in its own file whose modification time tracks
+    the last access, so the least recently used entries are evicted first
+    once the cache grows over ``max_size`` bytes.
+    '''
+    def __init__(self, path, max_size=DEFAULT_DISK_CACHE_SIZE * 1024 * 1024):
+        self.path = path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self._size = None
+
+    def filename(self, key):
+        digest = hashlib.sha256(key.encode('utf8')).hexdigest()
+        return os.path.join(self.path, digest + '.json')
+
+    def get(self, key, default=None):
+        filename = self.filename(key)
+        try:
+            with open(filename, encoding='utf8') as f:
+                value = json.load(f)
+            os.utime(filename)
+        except (OSError, ValueError):
+            return default
+        return value
+
+    def set(self, key, value):
+        filename = self.filename(key)
+        content = json.dumps(value)
+        tmp = '{0}.{1}.{2}.tmp'.format(filename, os.getpid(), threading.get_ident())
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with self.lock:
+                self.size()  # Measure existing entries before this one is written
+            previous = os.path.getsize(filename) if os.path.exists(filename) else 0
+            with open(tmp, 'w', encoding='utf8') as f:
+                f.write(content)
+            os.replace(tmp, filename)
+        except OSError:
+            return  # A cache failure should never break a command
+        with self.lock:
+            self._size = self.size() + len(content) - previous
+            if self._size > self.max_size:
+                self.evict()
+
+    def discard(self, key):
+        try:
+            os.remove(self.filename(key))
+        except OSError:
+            pass
+
+    def entries(self):
+        try:
+            return [e for e in os.scandir(self.path) if e.name.endswith('.json')]
+        except OSError:
+            return []
+
+    def size(self):
+        if self._size is None:
+            self._size = sum(e.stat().st_size for e in self.entries())
+        return self._size
+
+    def evict(self):
+        '''Remove the least recently used entries until 90% of the maximum size'''
+        entries = sorted(((e.stat(), e.path) for e in self.entries()), key=lambda e: e[0].st_mtime)
+        size = sum(stat.st_size for stat, _ in entries)
+        for stat, path in entries:
+            if size <= self.max_size * .9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= stat.st_size
+        self._size = size
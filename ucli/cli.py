@@ -1,7 +1,14 @@
+import importlib
+import sys
+
 import click
 
-from .api import Api
-from .log import init_logging
+from .cache import cache_dir, DEFAULT_DISK_CACHE_SIZE
+from .context import ApiFactory
+from .log import init_logging, LOG_FORMATS
+from .suggest import DEFAULT_TTL
+from .trace import tracer, start_profiling, profile_report
+from .utils import echo, InstancePath
 
 
 CONTEXT_SETTINGS = {
@@ -9,24 +16,149 @@ CONTEXT_SETTINGS = {
     'help_option_names': ['-?', '-h', '--help'],
 }
 
+#: Commands loaded on demand: name -> (import path, short help)
+COMMANDS = {
+    'apply': ('ucli.commands.apply:apply',
+              'Perform the transfers of a plan file (see dispatch --save-plan)'),
+    'bench': ('ucli.commands.bench:bench', 'Load-test the udata instance API'),
+    'datasets': ('ucli.commands.datasets:datasets', 'Datasets only related operations'),
+    'dispatch': ('ucli.commands.dispatch:dispatch',
+                 'Dispatch datasets to organizations given a CSV file '
+                 '(with dataset and recipient IDs)'),
+    'me': ('ucli.commands.me:me', 'Display my user information'),
+    'status': ('ucli.commands.status:status', 'Display current site status'),
+    'sync': ('ucli.commands.sync:sync',
+             'Sync the local index of organizations, users, datasets and reuses'),
+    'transfer': ('ucli.commands.transfer:transfer', 'Massive datasets or reuses transfer'),
+}
+
+
+class LazyGroup(click.Group):
+    '''
+    A group resolving its subcommands from a ``lazy_commands`` registry
+    mapping names to ``(import path, short help)`` pairs.
+
+    A command module is only imported when the command is invoked,
+    listing the commands in the help only relies on the registry.
+    '''
+    def __init__(self, *args, **kwargs):
+        self.lazy_commands = kwargs.pop('lazy_commands', {})
+        super(LazyGroup, self).__init__(*args, **kwargs)
+
+    def list_commands(self, ctx):
+        return sorted(set(self.commands) | set(self.lazy_commands))
 
-@click.group(context_settings=CONTEXT_SETTINGS)
-@click.option('--url', envvar='URL', default='http://localhost:7000',
-              help='The UData instance URL')
-@click.option('--token', envvar='TOKEN', help='Your UData API Key')
+    def get_command(self, ctx, name):
+        if name not in self.commands and name in self.lazy_commands:
+            module, attr = self.lazy_commands[name][0].split(':')
+            self.add_command(getattr(importlib.import_module(module), attr), name)
+        return super(LazyGroup, self).get_command(ctx, name)
+
+    def parse_args(self, ctx, args):
+        original = list(args)
+        rest = super(LazyGroup, self).parse_args(ctx, args)
+        # The group own arguments, preceding the subcommand and its arguments
+        ctx.meta['ucli.group_args'] = original[:len(original) - len(rest) - 1]
+        ctx.meta['ucli.command_args'] = original[len(original) - len(rest) - 1:]
+        return rest
+
+    def format_commands(self, ctx, formatter):
+        names = self.list_commands(ctx)
+        if not names:
+            return
+        limit = formatter.width - 6 - max(len(name) for name in names)
+        rows = []
+        for name in names:
+            if name in self.commands:
+                if self.commands[name].hidden:
+                    continue
+                help = self.commands[name].get_short_help_str(limit)
+            else:
+                help = click.utils.make_default_short_help(self.lazy_commands[name][1], limit)
+            rows.append((name, help))
+        with formatter.section('Commands'):
+            formatter.write_dl(rows)
+
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS, context_settings=CONTEXT_SETTINGS)
+@click.option('--url', envvar='URL', multiple=True, default=['http://localhost:7000'],
+              help='The UData instance URL, repeat it to run the command against several instances '
+                   '(prompts answers must then be piped on stdin or skipped with --force)')
+@click.option('--token', envvar='TOKEN', multiple=True,
+              help='Your UData API Key, either a single one or one per --url')
+@click.option('--instances', 'instances_file', type=click.Path(exists=True, dir_okay=False),
+              help='An INI file with an url and a token per instance to run the command against '
+                   '(prompts answers must then be piped on stdin or skipped with --force)')
 @click.option('-v', '--verbose', is_flag=True, help='Verbose output')
+@click.option('--log-format', type=click.Choice(LOG_FORMATS), default='text',
+              help='Logs format, JSON lines being written on stderr')
+@click.option('--progress', is_flag=True,
+              help='Display a live progress bar and only warnings '
+                   'instead of a line per processed item')
 @click.option('--ssl-check/--no-ssl-check', default=True,
               help='Disable SSL validation (for testing purpose)')
+@click.option('--pool-size', type=click.IntRange(1),
+              help='Number of hosts kept in the HTTP connection pool')
+@click.option('--pool-maxsize', type=click.IntRange(1),
+              help='Maximum number of connections kept per host')
+@click.option('--keep-alive/--no-keep-alive', default=True,
+              help='Reuse HTTP connections between API calls')
+@click.option('--rate-limit', type=click.FloatRange(0), default=0,
+              help='Maximum number of API calls per second (0 for unlimited)')
+@click.option('--adaptive', is_flag=True,
+              help='Adapt the number of parallel API calls to the server load '
+                   '(up to --pool-maxsize)')
+@click.option('--retries', type=click.IntRange(0),
+              help='Number of retries of API calls failing with a transient error')
+@click.option('--backoff', type=click.FloatRange(0),
+              help='Base delay in seconds between retries, doubled on each attempt')
+@click.option('--cache-dir', type=click.Path(file_okay=False), default=cache_dir,
+              help='Directory where local caches are stored')
+@click.option('--http-cache/--no-http-cache', default=False,
+              help='Cache API responses on disk and revalidate them with conditional requests')
+@click.option('--http-cache-size', type=click.IntRange(1), default=DEFAULT_DISK_CACHE_SIZE,
+              help='Maximum size of the HTTP cache in megabytes')
+@click.option('--suggest-ttl', type=click.IntRange(0), default=DEFAULT_TTL,
+              help='Number of seconds suggestions are cached (0 to disable)')
+@click.option('--index', is_flag=True,
+              help='Resolve IDs and names from the local index (see sync) before querying the API')
+@click.option('--stats', is_flag=True,
+              help='Display API calls statistics at the end of the command')
+@click.option('--stats-json', type=InstancePath(dir_okay=False),
+              help='Export API calls statistics as JSON into this file')
+@click.option('--profile', is_flag=True,
+              help='Profile the command (main thread) and display the slowest calls')
+@click.option('--trace', type=InstancePath(dir_okay=False),
+              help='Export a Chrome trace-event file of API calls, CSV reads, prompts and logs')
 @click.pass_context
-def cli(ctx, url, token, verbose, **kwargs):
+def cli(ctx, url, token, instances_file, verbose, log_format, progress, stats, stats_json, profile,
+        trace, **kwargs):
     '''UData remote client'''
-    init_logging(verbose)
-    ctx.obj = Api(url, token, **kwargs)
+    if instances_file or len(url) > 1 or len(token) > 1:
+        from .fanout import read_instances, pair_instances, fanout, child_args
+        instances = read_instances(instances_file) if instances_file else pair_instances(url, token)
+        if len(instances) > 1:
+            # Prompts answers are replayed to each instance
+            stdin = None if sys.stdin.isatty() else click.get_text_stream('stdin').read()
+            args = child_args(ctx.meta['ucli.group_args']) + ctx.meta['ucli.command_args']
+            ctx.exit(fanout(instances, args, stdin))
+        url, token = [instances[0].url], [instances[0].token]
+    url, token = url[0], token[0] if token else None
+
+    if profile:
+        profiler = start_profiling()
+        ctx.call_on_close(lambda: echo(profile_report(profiler), err=True))
+    if trace:
+        tracer.enable()
+        ctx.call_on_close(lambda: tracer.export(trace))
+    init_logging(verbose, log_format, progress)
 
+    def setup(api):
+        if stats_json:
+            ctx.call_on_close(lambda: api.stats.export(stats_json))
+        if stats:
+            ctx.call_on_close(api.stats.display)
 
-# Import commands
-import ucli.commands.me  # noqa
-import ucli.commands.dispatch  # noqa
-import ucli.commands.status  # noqa
-import ucli.commands.transfer  # noqa
-import ucli.commands.datasets.delete  # noqa
+    # Only built when a command needs it, never for help or usage errors
+    ctx.obj = ApiFactory(url, token, setup=setup, stats=stats or bool(stats_json), **kwargs)
+    ctx.call_on_close(ctx.obj.close)
@@ -0,0 +1,53 @@
+import logging
+
+from textwrap import dedent
+
+import click
+
+from ucli.context import pass_api
+from ucli.journal import open_journal
+from ucli.plan import read_plan, apply_plan, TRANSFERED, RESUMED
+from ucli.utils import header, confirm, label_arrow, white, success, InstancePath
+
+log = logging.getLogger(__name__)
+
+
+@click.command()
+@click.option('--force', '-f', is_flag=True)
+@click.option('--concurrency', '-c', type=click.IntRange(1), default=1,
+              help='Number of transfers performed in parallel')
+@click.option('--journal', 'journal_path', type=InstancePath(dir_okay=False),
+              help='Record each transfer outcome in this file '
+                   'and skip transfers already done on rerun')
+@click.argument('plan', type=InstancePath(exists=True, dir_okay=False))
+@pass_api
+def apply(api, plan, force, concurrency, journal_path):
+    '''Perform the transfers of a plan file (see dispatch --save-plan)'''
+    header(apply.__doc__)
+    plan_header, total, transfers = read_plan(plan)
+    label = plan_header['subject'].lower()
+
+    label_arrow('Summary', dedent('''
+    Will transfer {total} {type}(s)
+        planned on {created} from {source}
+        to the {recipient}(s) designated by the plan.
+    The transfer reason is: {message}
+    ''').format(
+        total=white(total),
+        type=white(label),
+        created=plan_header['created'],
+        source=white(plan_header.get('source') or plan),
+        recipient=white(plan_header['recipient'].lower()),
+        message=plan_header['comment'],
+    ))
+    if not force:
+        confirm('Are you sure?', abort=True)
+    click.echo('')
+
+    with open_journal(journal_path) as journal:
+        outcomes = apply_plan(api, plan_header, transfers, journal, concurrency=concurrency,
+                              total=total)
+
+    if outcomes[RESUMED]:
+        log.info('%s transfer(s) already done according to the journal', outcomes[RESUMED])
+    success('Transfered {0} on {1} {2}(s)'.format(outcomes[TRANSFERED], total, label))
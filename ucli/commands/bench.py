@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import random
+import time
+
+import click
+
+from ucli.context import pass_async_api
+from ucli.stats import Stats
+from ucli.throttle import TokenBucket
+from ucli.utils import header, label_arrow, white
+
+log = logging.getLogger(__name__)
+
+WORKLOADS = ('list', 'get', 'suggest')
+
+#: Delay in seconds between two progress reports
+REPORT_INTERVAL = 5
+
+
+@click.command()
+@click.option('--workload', '-w', type=click.Choice(WORKLOADS), multiple=True,
+              help='Workloads to mix: datasets pages, datasets details or suggest queries '
+                   '(all by default)')
+@click.option('--concurrency', '-c', type=click.IntRange(1), default=4,
+              help='Number of concurrent clients (coroutines sharing a single thread)')
+@click.option('--rate', type=click.FloatRange(0), default=0,
+              help='Target number of requests per second (0 for as fast as possible)')
+@click.option('--duration', '-d', type=click.FloatRange(1), default=30,
+              help='Duration of the test in seconds')
+@click.option('--fields', default='id,slug,title,owner,organization',
+              help='X-Fields projection of datasets details')
+@click.option('--page-size', type=click.IntRange(1), default=20,
+              help='Datasets pages size')
+@pass_async_api
+async def bench(api, workload, concurrency, rate, duration, fields, page_size):
+    '''Load-test the udata instance API'''
+    header(bench.__doc__)
+    workloads = workload or WORKLOADS
+
+    # Sample identifiers and words to build realistic requests
+    sample = await api.get('datasets/', fields='data{id,title},total', page_size=100)
+    ids = [d['id'] for d in sample['data']]
+    words = sorted({w for d in sample['data'] for w in d['title'].split() if len(w) > 3})
+    words = words or ['data']
+    pages = max(1, min(sample['total'] // page_size, 1000))
+    if not ids and 'get' in workloads:
+        log.warning('No dataset found, skipping the "get" workload')
+        workloads = [w for w in workloads if w != 'get']
+    if not workloads:
+        return
+
+    def make_request():
+        kind = random.choice(workloads)
+        if kind == 'list':
+            return 'datasets/', {'page': random.randint(1, pages), 'page_size': page_size}, {}
+        elif kind == 'get':
+            return 'datasets/{0}/'.format(random.choice(ids)), {}, {'X-Fields': fields}
+        return 'datasets/suggest/', {'q': random.choice(words)[:5], 'size': 10}, {}
+
+    stats = Stats(api.root)
+    bucket = TokenBucket(rate, burst=concurrency) if rate else None
+    start = time.monotonic()
+    deadline = start + duration
+
+    async def client():
+        while time.monotonic() < deadline:
+            if bucket:
+                wait = bucket.try_acquire()
+                if wait:
+                    await asyncio.sleep(min(wait, deadline - time.monotonic()))
+                    continue
+            path, params, headers = make_request()
+            url = api.url(path)
+            sent = time.monotonic()
+            try:
+                response = await api.send('GET', url, params=params, headers=api.headers(**headers))
+            except api.RequestException:
+                stats.record('GET', url, latency=time.monotonic() - sent)
+                continue
+            stats.record('GET', url, response.status_code, time.monotonic() - sent,
+                         len(response.content))
+
+    async def report():
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            calls, _ = stats.totals()
+            log.info('%s requests, %.1f req/s', calls, calls / (time.monotonic() - start))
+
+    label_arrow('Workloads', ', '.join(workloads))
+    label_arrow('Concurrency', concurrency)
+    label_arrow('Target rate', '{0} req/s'.format(rate) if rate else 'unlimited')
+    clients = asyncio.gather(*(client() for _ in range(concurrency)))
+    reporter = asyncio.ensure_future(report())
+    try:
+        await clients
+    except asyncio.CancelledError:  # Interrupted (Ctrl-C)
+        log.warning('Interrupted')
+        clients.cancel()
+    finally:
+        reporter.cancel()
+    elapsed = time.monotonic() - start
+
+    calls, errors = stats.totals()
+    label_arrow('Throughput', white('{0:.1f} req/s'.format(calls / elapsed)))
+    label_arrow('Errors', '{0} ({1:.1%})'.format(errors, errors / calls if calls else 0))
+    stats.display()
@@ -1,7 +1,17 @@
-from ucli.cli import cli
+import click
 
+from ucli.cli import LazyGroup
 
-@cli.group()
+#: Datasets commands loaded on demand: name -> (import path, short help)
+COMMANDS = {
+    'delete': ('ucli.commands.datasets.delete:delete',
+               'Massive datasets deletion from a CSV file or a query'),
+    'export': ('ucli.commands.datasets.export:export',
+               'Export datasets metadata as JSON lines or CSV'),
+}
+
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS)
 def datasets():
     '''Datasets only related operations'''
     pass
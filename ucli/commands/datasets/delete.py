@@ -1,45 +1,171 @@
 import csv
 import logging
-import sys
-
-from textwrap import dedent
+from collections import Counter
+from datetime import datetime, timezone
 
 import click
 
-from ucli import suggest
-from ucli.api import pass_api
-from ucli.utils import header, prompt_choices, choice_enum, label_arrow, white, success
-
-from . import datasets
+from ucli.context import pass_api
+from ucli.concurrency import imap
+from ucli.journal import open_journal, DONE, FAILED
+from ucli.log import BufferedLogger
+from ucli.progress import Progress
+from ucli.trace import tracer
+from ucli.utils import header, confirm, exit, label_arrow, white, success, count_rows, InstancePath
 
 log = logging.getLogger(__name__)
 
+# Datasets outcomes
+DELETED = 'deleted'
+GONE = 'gone'
+MISSING = 'missing'
+RESUMED = 'resumed'
+
+
+def parse_filters(ctx, param, value):
+    '''Parse ``KEY=VALUE`` pairs into a dict'''
+    filters = {}
+    for pair in value:
+        key, sep, val = pair.partition('=')
+        if not sep or not key:
+            raise click.BadParameter('expected KEY=VALUE, got "{0}"'.format(pair))
+        filters[key] = val
+    return filters
+
+
+def parse_date(value):
+    '''Parse an ISO date into an aware datetime (UTC if it has no offset), ``None`` if invalid'''
+    if not value:
+        return None
+    try:
+        date = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    except ValueError:
+        return None
+    return date if date.tzinfo else date.replace(tzinfo=timezone.utc)
+
 
-@datasets.command()
-@click.argument('csvfile', type=click.File('r'))
-                # help='The CSV file containing identifiers to remove')
+def iter_matching(api, items, filters, created_before=None):
+    '''
+    Stream the IDs of the datasets matching ``filters``, starting with the ``items`` listing
+    (fetched with their ``created_at`` field).
+
+    Deletions shift the following pages while they are fetched so some datasets
+    are missed by a single pass: the listing is swept again until no new ID shows up.
+    Datasets created after ``created_before`` (an aware datetime) are left untouched.
+    '''
+    seen = set()
+    ignored = 0
+    while True:
+        new = 0
+        for item in items:
+            if item['id'] in seen:
+                continue
+            seen.add(item['id'])
+            created_at = parse_date(item.get('created_at'))
+            if created_before and created_at and created_at > created_before:
+                ignored += 1
+                continue
+            new += 1
+            yield item['id']
+        if not new:
+            break
+        log.debug('Sweeping the listing again for datasets shifted by deletions')
+        items = api.paginate('datasets/', fields='id,created_at', prefetch=True, **filters)
+    if ignored:
+        log.warning('%s matching dataset(s) created after the confirmation have been left', ignored)
+
+
+@click.command()
+@click.argument('csvfile', type=click.File('r'), required=False)
 @click.option('--column', type=str, default='id',
-                help='The name of the column containing identifiers to remove')
+              help='The name of the column containing identifiers to remove')
+@click.option('--owner', help='Delete the datasets owned by this user ID instead of a CSV file')
+@click.option('--organization',
+              help='Delete the datasets of this organization ID instead of a CSV file')
+@click.option('--tag', help='Delete the datasets having this tag instead of a CSV file')
+@click.option('--filter', 'filters', multiple=True, callback=parse_filters, metavar='KEY=VALUE',
+              help='Delete the datasets matching this datasets list API filter (can be repeated), '
+                   'filters matching the whole catalog are refused')
+@click.option('--force', '-f', is_flag=True,
+              help='Do not ask confirmation before deleting datasets by query')
+@click.option('--journal', 'journal_path', type=InstancePath(dir_okay=False),
+              help='Record each dataset outcome in this file '
+                   'and skip datasets already done on rerun')
+@click.option('--concurrency', '-c', type=click.IntRange(1), default=1,
+              help='Number of datasets deleted in parallel')
 @pass_api
-def delete(api, csvfile, column):
-    '''Massive datasets deletion from a CSV file'''
+def delete(api, csvfile, column, owner, organization, tag, filters, force, journal_path,
+           concurrency):
+    '''Massive datasets deletion from a CSV file or a query'''
+    for name, value in (('owner', owner), ('organization', organization), ('tag', tag)):
+        if value:
+            filters[name] = value
+    if bool(csvfile) == bool(filters):
+        raise click.UsageError('Expect either a CSV file or some filters')
     header(delete.__doc__)
 
-    data = csv.DictReader(csvfile)
-    deleted = 0
+    if csvfile:
+        progress = Progress(count_rows(csvfile), unit='datasets')
+        data = tracer.iterate(csv.DictReader(csvfile), 'read row', 'csv')
+        ids = (row[column] for row in data)
+    else:
+        items = api.paginate('datasets/', fields='id,created_at', prefetch=True, **filters)
+        # The API ignores unknown filters (ie. a typo) which would then match everything
+        catalog = api.paginate('datasets/', fields='id', page_size=1)
+        if items.total and items.total >= catalog.total:
+            exit('The filters match the whole catalog ({0} datasets), '
+                 'refusing to delete it'.format(catalog.total),
+                 'Check the filters keys, the API ignores the unknown ones')
+        label_arrow('Summary', 'Will delete the {0} dataset(s) matching {1}'.format(
+            white(items.total), ', '.join('{0}={1}'.format(*f) for f in sorted(filters.items()))))
+        if not force:
+            confirm('Are you sure?', abort=True)
+        confirmed_at = datetime.now(timezone.utc)
+        progress = Progress(items.total, unit='datasets')
+        ids = iter_matching(api, items, filters, created_before=confirmed_at)
 
-    for row in data:
-        id = row[column]
+    def process(id, log):
+        '''Delete a single dataset, returns its outcome'''
+        if journal.is_done(id):
+            return RESUMED
         response = api.delete('datasets/{id}/'.format(id=id), allow_failure=True)
         if response.status_code == 204:
-            deleted += 1
             log.info('Deleted dataset %s', id)
+            outcome = DELETED
         elif response.status_code == 410:
             log.info('Dataset %s is already deleted', id)
+            outcome = GONE
         elif response.status_code == 404:
             log.warning('Dataset %s does not exists', id)
+            outcome = MISSING
         else:
-            log.error('Unable to delete delete dataset %s: %s (%s)', id, response.reason, response.status_code,
+            log.error('Unable to delete dataset %s: %s (%s)', id, response.reason,
+                      response.status_code,
                       extra={'details': getattr(response, 'error_details', None)})
+            journal.record(id, FAILED, status_code=response.status_code)
+            return FAILED
+        journal.record(id, DONE, status_code=response.status_code)
+        return outcome
+
+    def process_buffered(id):
+        buffer = BufferedLogger()
+        return process(id, log=buffer), buffer
+
+    outcomes = Counter()
+    with open_journal(journal_path) as journal:
+        if concurrency > 1:
+            # Workers output is buffered and replayed in the CSV (or listing) order
+            for outcome, buffer in imap(process_buffered, ids, workers=concurrency):
+                buffer.replay(log)
+                outcomes[outcome] += 1
+                progress.advance(failed=outcome == FAILED)
+        else:
+            for id in ids:
+                outcome = process(id, log)
+                outcomes[outcome] += 1
+                progress.advance(failed=outcome == FAILED)
 
-    success('Deleted {0} dataset(s)'.format(deleted))
+    if outcomes[RESUMED]:
+        log.info('%s dataset(s) already processed according to the journal', outcomes[RESUMED])
+    progress.summary()
+    success('Deleted {0} dataset(s)'.format(outcomes[DELETED]))
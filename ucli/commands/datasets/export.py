@@ -0,0 +1,132 @@
+import csv
+import gzip
+import json
+import logging
+import math
+
+from itertools import chain
+
+import click
+
+from ucli import jsonlib
+from ucli.context import pass_api
+from ucli.concurrency import imap
+from ucli.progress import Progress
+from ucli.utils import header, label_arrow, success, white, InstancePath
+
+log = logging.getLogger(__name__)
+
+FORMATS = ('jsonl', 'csv')
+
+DEFAULT_FIELDS = 'id,slug,title,owner{id},organization{id},created_at,last_modified'
+
+#: Number of datasets fetched per page by exports
+EXPORT_PAGE_SIZE = 100
+
+#: Pages are fetched by number: a stable order keeps them consistent while the catalog changes.
+#: Datasets created during an export come last and are left out, but a dataset deleted
+#: during an export shifts the following ones so that one may then be missed.
+EXPORT_SORT = 'created'
+
+
+def top_level_fields(fields):
+    '''Top level names of an X-Fields projection, ie. ``id`` and ``owner`` for ``id,owner{id}``'''
+    names, depth, current = [], 0, ''
+    for char in fields:
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            names.append(current.strip())
+            current = ''
+        elif depth == 0:
+            current += char
+    if current.strip():
+        names.append(current.strip())
+    return names
+
+
+def flatten(value):
+    '''Render a nested value as a CSV cell: objects by their ID, lists as comma separated values'''
+    if isinstance(value, dict):
+        return value.get('id', json.dumps(value))
+    elif isinstance(value, list):
+        return ','.join(str(flatten(v)) for v in value)
+    return value
+
+
+def open_output(filename, compress):
+    if compress:
+        return gzip.open(filename, 'wt', encoding='utf8', newline='')
+    return open(filename, 'w', encoding='utf8', newline='')
+
+
+@click.command()
+@click.argument('output', type=InstancePath(dir_okay=False, writable=True))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS),
+              help='Output format, guessed from the file extension by default')
+@click.option('--gzip', 'compress', is_flag=True, default=None,
+              help='Compress the output, implied by a ".gz" extension')
+@click.option('--owner', help='Only export datasets owned by this user ID')
+@click.option('--organization', help='Only export datasets of this organization ID')
+@click.option('--fields', default=DEFAULT_FIELDS, show_default=True,
+              help='The X-Fields projection of exported datasets')
+@click.option('--page-size', type=click.IntRange(1), default=EXPORT_PAGE_SIZE,
+              help='Number of datasets fetched per page')
+@click.option('--concurrency', '-c', type=click.IntRange(1), default=4,
+              help='Number of pages fetched in parallel')
+@pass_api
+def export(api, output, fmt, compress, owner, organization, fields, page_size, concurrency):
+    '''Export datasets metadata as JSON lines or CSV'''
+    header(export.__doc__)
+    name = output[:-3] if output.endswith('.gz') else output
+    compress = output.endswith('.gz') if compress is None else compress
+    fmt = fmt or ('csv' if name.endswith('.csv') else 'jsonl')
+
+    filters = {'sort': EXPORT_SORT}
+    if owner:
+        filters['owner'] = owner
+    if organization:
+        filters['organization'] = organization
+    projection = 'data{{{0}}},total'.format(fields)
+
+    def fetch(page):
+        response = api.get('datasets/', fields=projection, page=page, page_size=page_size,
+                           **filters)
+        return response['data']
+
+    first = api.get('datasets/', fields=projection, page=1, page_size=page_size, **filters)
+    total = first['total']
+    pages = int(math.ceil(total / float(page_size)))
+    label_arrow('Exporting', '{0} dataset(s) into {1} ({2}{3})'.format(
+        white(total), white(output), fmt, ', gzip' if compress else ''))
+
+    progress = Progress(total, unit='datasets')
+    columns = top_level_fields(fields)
+    with open_output(output, compress) as out:
+        if fmt == 'csv':
+            writer = csv.writer(out)
+            writer.writerow(columns)
+
+            def write(item):
+                writer.writerow([flatten(item.get(c)) for c in columns])
+        else:
+            def write(item):
+                out.write(jsonlib.dumps(item))
+                out.write('\n')
+
+        # Pages are fetched in parallel but written in order, a few pages ahead at most
+        batches = imap(fetch, range(2, pages + 1), workers=concurrency)
+        exported = 0
+        for batch in chain([first['data']], batches):
+            for item in batch:
+                write(item)
+            exported += len(batch)
+            progress.advance(len(batch))
+
+    progress.summary()
+    if exported != total:
+        log.warning('%s dataset(s) expected but %s exported, the catalog changed during the export',
+                    total, exported)
+    success('Exported {0} dataset(s)'.format(exported))
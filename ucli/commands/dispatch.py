@@ -1,13 +1,26 @@
 import csv
 import logging
 
+from collections import Counter
+
 from textwrap import dedent
 
 import click
 
-from ucli.api import pass_api
-from ucli.cli import cli
-from ucli.utils import header, prompt_choices, choice_enum, label_arrow, white, success, WARNING, yellow
+from ucli.context import pass_api
+from ucli.cache import CachedGetter, DEFAULT_CACHE_SIZE
+from ucli.concurrency import imap
+from ucli.index import get_index
+from ucli.journal import open_journal, DONE, FAILED
+from ucli.log import BufferedLogger
+from ucli.plan import (
+    plan_header, plan_entry, recipient_name, write_plan, apply_plan, TRANSFERED, SKIPPED, RESUMED
+)
+from ucli.utils import (
+    header, prompt, prompt_choices, confirm, choice_enum, label_arrow, white, success, count_rows,
+    WARNING, yellow, InstancePath
+)
+from ucli.trace import tracer
 
 log = logging.getLogger(__name__)
 
@@ -16,13 +29,30 @@ TYPE_CHOICES, (IS_DATASET, IS_REUSE) = choice_enum('Dataset', 'Reuse')
 
 TARGET_CHOICES, (ORG_TARGET, USER_TARGET) = choice_enum('Organizations', 'Users')
 
+# Rows outcomes, besides the transfers ones
+PLANNED = 'planned'
+DUPLICATE = 'duplicate'
+
+
+def cell(row, index):
+    return row[index] if index < len(row) else None
+
 
-@cli.command()
-@click.option('--dryrun', '-d', is_flag=True)
+@click.command()
+@click.option('--dryrun', '-d', is_flag=True,
+              help='Only check rows and report the transfers to perform')
+@click.option('--save-plan', type=InstancePath(dir_okay=False, writable=True),
+              help='Write the transfers to perform into this plan file instead of applying them')
 @click.option('--force', '-f', is_flag=True)
+@click.option('--concurrency', '-c', type=click.IntRange(1), default=1,
+              help='Number of rows checked and transfered in parallel')
+@click.option('--cache-size', type=click.IntRange(1), default=DEFAULT_CACHE_SIZE,
+              help='Number of targets lookups kept in memory')
+@click.option('--journal', 'journal_path', type=InstancePath(dir_okay=False),
+              help='Record each row outcome in this file and skip rows already done on rerun')
 @click.argument('file', type=click.File('r', encoding='utf8'))
 @pass_api
-def dispatch(api, file, dryrun, force):
+def dispatch(api, file, dryrun, save_plan, force, concurrency, cache_size, journal_path):
     '''Dispatch datasets to organizations given a CSV file (with dataset and recipient IDs)'''
     header(dispatch.__doc__)
     me = api.get('me')
@@ -30,21 +60,21 @@ def dispatch(api, file, dryrun, force):
 
     dialect = csv.Sniffer().sniff(file.read(1024))
     file.seek(0)
-    reader = csv.DictReader(file, dialect=dialect)
-    rows = list(reader)
+    fieldnames = next(csv.reader(file, dialect=dialect))
+    total = count_rows(file, dialect=dialect)
 
-    choices = list(enumerate(reader.fieldnames))
+    choices = list(enumerate(fieldnames))
 
     # Prompt user for object type
-    response = prompt_choices('Item ID column', *choices)
-    item_col = reader.fieldnames[int(response)]
+    item_index = int(prompt_choices('Item ID column', *choices))
+    item_col = fieldnames[item_index]
     item_type = prompt_choices('Item type', *TYPE_CHOICES)
 
-    response = prompt_choices('Target column', *choices)
-    target_col = reader.fieldnames[int(response)]
+    target_index = int(prompt_choices('Target column', *choices))
+    target_col = fieldnames[target_index]
     target_type = prompt_choices('Target type', *TARGET_CHOICES)
 
-    message = click.prompt('Please enter the transfer reason')
+    message = prompt('Please enter the transfer reason')
     warning = ''
 
     if not is_admin:
@@ -68,15 +98,15 @@ def dispatch(api, file, dryrun, force):
         target_col=white(target_col),
         source=white(file.name),
         message=message,
-        total=white(len(rows)),
+        total=white(total),
         warning=warning,
     ))
-    if not force:
-        click.confirm('Are you sure?', abort=True)
+    planning = dryrun or bool(save_plan)
+    if not (force or planning):
+        confirm('Are you sure?', abort=True)
     click.echo('')
 
-    # Perform
-    total = 0
+    # Plan
     item_endpoint = 'datasets/{id}/' if item_type == IS_DATASET else 'reuses/{id}/'
     item_type_label = 'dataset' if item_type == IS_DATASET else 'reuse'
     item_class = 'Dataset' if item_type == IS_DATASET else 'Reuse'
@@ -84,56 +114,140 @@ def dispatch(api, file, dryrun, force):
     target_type_label = 'organization' if target_type == ORG_TARGET else 'user'
     target_class = 'Organization' if target_type == ORG_TARGET else 'User'
     target_fields = 'id,name' if target_type == ORG_TARGET else 'id,first_name,last_name'
-    for line, row in enumerate(rows, 2):  # Line 1 is header
-        item_id = row[item_col]
-        item = api.get(item_endpoint.format(id=item_id),
-                       fields='id,slug,title,owner,organization',
-                       allow_failure=True)
+    item_fields = 'id,slug,title,owner{id},organization{id}'
+    owner_attr = 'organization' if target_type == ORG_TARGET else 'owner'
+    target_kind = 'organizations' if target_type == ORG_TARGET else 'users'
+    targets = CachedGetter(api, cache_size)
+    index = get_index(api)
+    journal = open_journal(journal_path)
+    outcomes = Counter()
+
+    def record(key, status, **extra):
+        if not planning:
+            journal.record(key, status, **extra)
+
+    def iter_rows():
+        '''Stream ``(line, (item_id, target_id))`` keeping only the selected columns'''
+        file.seek(0)
+        reader = tracer.iterate(csv.reader(file, dialect=dialect), 'read row', 'csv')
+        next(reader)  # Skip header
+        line = 1
+        for row in reader:
+            if not row:  # Blank lines are ignored like csv.DictReader does
+                continue
+            line += 1
+            yield line, (cell(row, item_index), cell(row, target_index))
+
+    def scan_rows():
+        '''
+        First pass over the rows: the last line of each item (the last row of an item wins)
+        and the distinct targets, only IDs and line numbers being kept in memory
+        '''
+        last_lines = {}
+        target_ids = set()
+        for line, (item_id, target_id) in iter_rows():
+            if item_id and target_id:
+                last_lines[item_id] = line
+                target_ids.add(target_id)
+        return last_lines, target_ids
+
+    def iter_unique_rows(last_lines):
+        '''Stream the ``(item_id, (line, target_id))`` rows to check, once per item not done yet'''
+        for line, (item_id, target_id) in iter_rows():
+            if not item_id or not target_id:
+                log.warning('Missing %s or %s ID on line %s',
+                            item_type_label, target_type_label, line)
+                outcomes[FAILED] += 1
+            elif last_lines[item_id] != line:
+                log.info('Ignoring line %s as %s %s is listed again on line %s',
+                         line, item_type_label, item_id, last_lines[item_id])
+                outcomes[DUPLICATE] += 1
+            elif journal.is_done('{0}:{1}:{2}'.format(line, item_id, target_id)):
+                log.debug('Line %s already processed', line)
+                outcomes[RESUMED] += 1
+            else:
+                yield item_id, (line, target_id)
+
+    def get_item(item_id):
+        '''
+        The item from the API, never from the index as its owner decides the transfer.
+        Rows are deduplicated so each item is fetched once and is not memoized.
+        '''
+        return api.get(item_endpoint.format(id=item_id), fields=item_fields, allow_failure=True)
+
+    def get_target(target_id):
+        '''The target from the index if enabled, or from the API (memoized)'''
+        target = index.get(target_kind, target_id) if index else None
+        return target or targets.get(target_endpoint.format(id=target_id), fields=target_fields)
+
+    def validate(args, log):
+        '''Check a single row, returns its outcome and its plan entry if it needs a transfer'''
+        item_id, (line, target_id) = args
+        key = '{0}:{1}:{2}'.format(line, item_id, target_id)
+        item = get_item(item_id)
         if hasattr(item, 'error_details'):
             log.warning('Error on line %s for %s %s: %s',
                         line, item_type_label, item_id, item.error_details)
-            continue
-        target_id = row[target_col]
-        target = api.get(target_endpoint.format(id=target_id),
-                         fields=target_fields,
-                         allow_failure=True)
+            record(key, FAILED)
+            return FAILED, None
+        target = get_target(target_id)
         if hasattr(target, 'error_details'):
             log.warning('Error on line %s for %s %s: %s',
                         line, target_type_label, target_id, target.error_details)
-            continue
-        if target_type == ORG_TARGET:
-            target_name = target['name']
-            if item.get('organization', {}).get('id') == target_id:
-                log.info('Skipping %s %s (%s) as %s is already the owner',
-                         item_type_label, item['title'], item['id'], target_name)
-                continue
+            record(key, FAILED)
+            return FAILED, None
+        if (item.get(owner_attr) or {}).get('id') == target_id:
+            log.info('Skipping %s %s (%s) as %s is already the owner',
+                     item_type_label, item['title'], item['id'], recipient_name(target))
+            record(key, DONE)
+            return SKIPPED, None
+        log.log(logging.INFO if planning else logging.DEBUG, 'Planning %s %s (%s) transfer to %s',
+                item_type_label, item['title'], item['id'], recipient_name(target))
+        return PLANNED, plan_entry(line, item, target)
+
+    def validate_buffered(args):
+        buffer = BufferedLogger()
+        return validate(args, log=buffer) + (buffer,)
+
+    def iter_plan(last_lines, target_ids):
+        '''Validate rows concurrently and stream the resulting plan entries in lines order'''
+        # Fetch each distinct target once, all of them being needed
+        for _ in imap(get_target, target_ids, workers=concurrency):
+            pass
+        rows = iter_unique_rows(last_lines)
+        for outcome, entry, buffer in imap(validate_buffered, rows, workers=concurrency):
+            buffer.replay(log)
+            outcomes[outcome] += 1
+            if entry:
+                yield entry
+
+    plan = plan_header(item_class, target_class, message, source=file.name)
+    with journal:
+        last_lines, target_ids = scan_rows()
+        distinct = len(last_lines)
+        label_arrow('Planning', '{0} distinct {1}(s) to check'.format(
+            white(distinct), item_type_label))
+        # Plan entries are streamed into the plan file or applied as soon as they are checked
+        entries = iter_plan(last_lines, target_ids)
+        if save_plan:
+            write_plan(save_plan, plan, entries)
+        elif dryrun:
+            for _ in entries:
+                pass
         else:
-            target_name = '{first_name} {last_name}'.format(**target)
-        log.info('Transfering %s %s (%s) to %s',
-                 item_type_label, item['title'], item['id'], target_name)
-
-        if dryrun:
-            continue
-
-        request_response = api.post('transfer/', {
-            'comment': message,
-            'recipient': {'class': target_class, 'id': target['id']},
-            'subject': {'class': item_class, 'id': item['id']}
-        })
-
-        transfer_url = 'transfer/{id}/'.format(**request_response)
-        accept_reponse = api.post(transfer_url, {
-            'response': 'accept',
-            'comment': 'Automatically accepted by udata-cli',
-        }, allow_failure=True)
-
-        if hasattr(accept_reponse, 'error_details'):
-            log.warning('Unable to complete %s %s transfer to (%s) to %s: %s',
-                        item_type_label, item['title'], item['id'],
-                        target_name, accept_reponse.error_details)
-        else:
-            log.info('Transfered %s %s (%s) to %s',
-                     item_type_label, item['title'], item['id'], target_name)
-            total += 1
-
-    success('Transfered {0} on {1} {2}(s)'.format(total, len(rows), item_type_label))
+            outcomes.update(apply_plan(api, plan, entries, journal, concurrency=concurrency,
+                                       total=distinct))
+
+    if outcomes[DUPLICATE]:
+        log.info('%s duplicated row(s) ignored', outcomes[DUPLICATE])
+    if outcomes[RESUMED]:
+        log.info('%s row(s) already processed according to the journal', outcomes[RESUMED])
+    log.info('Targets lookups: %s cache hit(s), %s miss(es)', targets.hits, targets.misses)
+    if save_plan:
+        success('Planned {0} {1} transfer(s) into {2}, apply them with: ucli apply {2}'.format(
+            outcomes[PLANNED], item_type_label, save_plan))
+    elif dryrun:
+        success('Would transfer {0} on {1} {2}(s)'.format(
+            outcomes[PLANNED], total, item_type_label))
+    else:
+        success('Transfered {0} on {1} {2}(s)'.format(outcomes[TRANSFERED], total, item_type_label))
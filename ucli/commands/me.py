@@ -1,9 +1,10 @@
-from ucli.api import pass_api
-from ucli.cli import cli
+import click
+
+from ucli.context import pass_api
 from ucli.utils import header, label_arrow
 
 
-@cli.command()
+@click.command()
 @pass_api
 def me(api):
     '''Display my user information'''
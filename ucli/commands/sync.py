@@ -0,0 +1,42 @@
+import logging
+import time
+
+import click
+
+from ucli.context import pass_api
+from ucli.concurrency import imap
+from ucli.index import open_index, KINDS, SYNC_PAGE_SIZE
+from ucli.utils import header, label_arrow, white, success
+
+log = logging.getLogger(__name__)
+
+
+@click.command()
+@click.option('--kind', 'kinds', type=click.Choice(sorted(KINDS)), multiple=True,
+              help='Only sync these objects kinds (can be repeated), all by default')
+@click.option('--full', is_flag=True,
+              help='Fetch everything again instead of the modified objects only, '
+                   'dropping the deleted ones')
+@click.option('--page-size', type=click.IntRange(1), default=SYNC_PAGE_SIZE,
+              help='Number of objects fetched per page')
+@click.option('--concurrency', '-c', type=click.IntRange(1), default=len(KINDS),
+              help='Number of objects kinds synced in parallel')
+@pass_api
+def sync(api, kinds, full, page_size, concurrency):
+    '''Sync the local index of organizations, users, datasets and reuses'''
+    header(sync.__doc__)
+    index = open_index(api)
+    kinds = kinds or sorted(KINDS)
+    label_arrow('Index', white(index.path))
+
+    def sync_kind(kind):
+        start = time.monotonic()
+        count = index.sync(api, kind, full=full, page_size=page_size)
+        return kind, count, time.monotonic() - start
+
+    total = 0
+    for kind, count, duration in imap(sync_kind, kinds, workers=concurrency):
+        log.info('%s: %s fetched in %.1fs, %s indexed',
+                 kind.capitalize(), count, duration, index.count(kind))
+        total += count
+    success('Synced {0} object(s)'.format(total))
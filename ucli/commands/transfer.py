@@ -1,13 +1,20 @@
 import logging
 
+from collections import Counter
 from textwrap import dedent
 
 import click
 
 from ucli import suggest
-from ucli.api import pass_api
-from ucli.cli import cli
-from ucli.utils import header, prompt_choices, choice_enum, label_arrow, white, success
+from ucli.context import pass_api
+from ucli.concurrency import pipeline
+from ucli.journal import FAILED
+from ucli.log import BufferedLogger
+from ucli.plan import ACCEPT_COMMENT, TRANSFERED
+from ucli.progress import Progress
+from ucli.utils import (
+    header, prompt, prompt_choices, confirm, choice_enum, label_arrow, white, success
+)
 
 log = logging.getLogger(__name__)
 
@@ -26,9 +33,11 @@ SOURCE_CHOICES = ADMIN_SOURCE_CHOICES[:2]
 TARGET_CHOICES, (AN_USER, AN_ORG) = choice_enum('An user', 'An Organization')
 
 
-@cli.command()
+@click.command()
+@click.option('--concurrency', '-c', type=click.IntRange(1), default=1,
+              help='Number of transfers requested and accepted in parallel')
 @pass_api
-def transfer(api):
+def transfer(api, concurrency):
     '''Massive datasets or reuses transfer'''
     header(transfer.__doc__)
     me = api.get('me')
@@ -40,7 +49,9 @@ def transfer(api):
     # Prompt user for source
     source_choices = ADMIN_SOURCE_CHOICES if is_admin else SOURCE_CHOICES
     source_choice = prompt_choices('Transfer from ?', *source_choices)
-    if source_choice == MY_ORGS:
+    if source_choice == MINE:
+        source = me
+    elif source_choice == MY_ORGS:
         org_choices = enumerate((o['name'] for o in me['organizations']), 1)
         org_choice = prompt_choices('Your organizations', *org_choices)
         org_index = int(org_choice) - 1
@@ -58,13 +69,16 @@ def transfer(api):
         target = suggest.organizations(api)
 
     # Prompt user for message
-    message = click.prompt('Please enter the transfer reason')
+    message = prompt('Please enter the transfer reason')
 
     # Fetch items
-    qs = {'owner': source['id']} if source_choice in (MINE, ANY_USER) else {'organization': source['id']}
-    qs['page_size'] = '1000'  # Try to fetch once
+    if source_choice in (MINE, ANY_USER):
+        qs = {'owner': source['id']}
+    else:
+        qs = {'organization': source['id']}
     endpoint = 'datasets/' if type_choice == IS_DATASET else 'reuses/'
-    items = api.get(endpoint, fields='data{id,slug,title,owner,organization},total', **qs)
+    # Always listed from the API, even with --index, as a stale index would transfer the wrong items
+    items = api.paginate(endpoint, fields='id', prefetch=True, **qs)
 
     # Display a summary and ask for confirmation
     if source_choice == MINE:
@@ -84,41 +98,88 @@ def transfer(api):
         source=white(source_label),
         target=white(target_label),
         message=message,
-        total=white(items['total']),
+        total=white(items.total),
     ))
-    click.confirm('Are you sure ?', abort=True)
+    confirm('Are you sure ?', abort=True)
+
+    # Transfered items leave the source listing and would shift the following pages,
+    # so only their IDs are gathered before mutating anything.
+    ids = [item['id'] for item in items]
 
     # Perform
     item_type = 'Dataset' if type_choice == IS_DATASET else 'Reuse'
-    for item in items['data']:
-        log.info('Transfering %s(%s)', item_type, item['id'])
-        request_payload = {
+    recipient = {
+        'class': 'Organization' if target_choice == AN_ORG else 'User',
+        'id': target['id'],
+    }
+
+    def post(state, path, data):
+        '''
+        ``api.post`` failing the item instead of the whole pipeline
+        on network errors still failing after the retries, returns ``None`` then.
+        '''
+        try:
+            return api.post(path, data, allow_failure=True)
+        except SystemExit:  # The error has already been displayed
+            state['log'].warning('Unable to transfer %s(%s): network error', item_type, state['id'])
+            state['outcome'] = FAILED
+
+    def create(state):
+        '''First stage: request the item transfer'''
+        state['log'].info('Transfering %s(%s)', item_type, state['id'])
+        request_response = post(state, 'transfer/', {
             'comment': message,
-            'recipient': {
-                'class': 'Organization' if target_choice == AN_ORG else 'User',
-                'id': target['id'],
-            },
-            'subject': {
-                'class': item_type,
-                'id': item['id'],
-            }
-        }
-
-        request_response = api.post('transfer/', request_payload)
-
-        accept_payload = {
+            'recipient': recipient,
+            'subject': {'class': item_type, 'id': state['id']},
+        })
+        if request_response is None:
+            return state
+        if hasattr(request_response, 'error_details'):
+            state['log'].warning('Unable to request %s(%s) transfer: %s',
+                                 item_type, state['id'], request_response.error_details)
+            state['outcome'] = FAILED
+        else:
+            state['transfer'] = request_response['id']
+        return state
+
+    def accept(state):
+        '''Second stage: accept the requested transfer'''
+        if 'outcome' in state:  # The request failed
+            return state
+        accept_reponse = post(state, 'transfer/{0}/'.format(state['transfer']), {
             'response': 'accept',
-            'comment': 'Automatically accepted by udata-cli',
-        }
-
-        transfer_url = 'transfer/{id}/'.format(**request_response)
-        accept_reponse = api.post(transfer_url, accept_payload)
-
+            'comment': ACCEPT_COMMENT,
+        })
+        if accept_reponse is None:
+            return state
+        if hasattr(accept_reponse, 'error_details'):
+            state['log'].warning('Unable to accept %s(%s) transfer %s: %s', item_type, state['id'],
+                                 state['transfer'], accept_reponse.error_details)
+            state['outcome'] = FAILED
+            return state
         msg = (
             '{subject[class]}({subject[id]}) '
             'transfered to '
             '{recipient[class]}({recipient[id]})'
         ).format(**accept_reponse)
-        log.info(msg)
-
-    success('Transfered {0} item(s)'.format(items['total']))
+        state['log'].info(msg)
+        state['outcome'] = TRANSFERED
+        return state
+
+    if concurrency > api.pool_maxsize:
+        log.warning('Concurrency (%s) is higher than the connection pool size (%s), '
+                    'consider raising --pool-maxsize', concurrency, api.pool_maxsize)
+    # Requests and acceptations run concurrently on different items,
+    # each item output being buffered and replayed once it is done.
+    states = ({'id': id, 'log': BufferedLogger()} for id in ids)
+    outcomes = Counter()
+    progress = Progress(len(ids), unit='items')
+    for state in pipeline(states, (create, concurrency), (accept, concurrency)):
+        state['log'].replay(log)
+        outcomes[state['outcome']] += 1
+        progress.advance(failed=state['outcome'] == FAILED)
+
+    progress.summary()
+    if outcomes[FAILED]:
+        log.warning('%s item(s) could not be transfered', outcomes[FAILED])
+    success('Transfered {0} item(s)'.format(outcomes[TRANSFERED]))
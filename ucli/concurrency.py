@@ -0,0 +1,109 @@
+import queue
+import threading
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+#: Marks the end of a pipeline queue
+END = object()
+
+
+def imap(func, iterable, workers=1, backlog=None):
+    '''
+    Apply ``func`` to each item of ``iterable`` using up to ``workers`` threads.
+
+    Results are yielded in input order whatever the completion order is,
+    and at most ``backlog`` items (twice the number of workers by default)
+    are in flight at once so huge inputs are never fully queued.
+    With a single worker, everything runs in the calling thread.
+    '''
+    if workers <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+    backlog = backlog or workers * 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for item in iterable:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= backlog:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def pipeline(iterable, *stages, backlog=None):
+    '''
+    Run each item of ``iterable`` through successive ``(func, workers)`` stages.
+
+    Each stage applies ``func`` to the previous stage results using its own
+    ``workers`` threads, so all stages progress at once on different items.
+    Stages are connected by queues of at most ``backlog`` items (twice the
+    stage workers by default) so a slow stage throttles the previous ones.
+
+    Last stage results are yielded as soon as they are completed, in any order.
+    Items failures should be handled by the stages functions: an exception
+    stops the pipeline and is raised by the iteration.
+    '''
+    queues = [queue.Queue(maxsize=backlog or workers * 2) for _, workers in stages]
+    results = queue.Queue()
+    queues.append(results)
+    remaining = [workers for _, workers in stages]
+    lock = threading.Lock()
+    errors = []
+    stopped = threading.Event()
+
+    def feed():
+        try:
+            for item in iterable:
+                if errors or stopped.is_set():
+                    break
+                queues[0].put(item)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            for _ in range(stages[0][1]):
+                queues[0].put(END)
+
+    def work(index):
+        func = stages[index][0]
+        inbox, outbox = queues[index], queues[index + 1]
+        try:
+            while True:
+                item = inbox.get()
+                if item is END:
+                    break
+                if errors or stopped.is_set():
+                    continue  # Drain the queue so upstream stages never block
+                try:
+                    outbox.put(func(item))
+                except BaseException as e:
+                    errors.append(e)
+        finally:
+            with lock:
+                remaining[index] -= 1
+                last = not remaining[index]
+            if last:  # Let the next stage workers (or the consumer) know there is nothing more
+                for _ in range(stages[index + 1][1] if index + 1 < len(stages) else 1):
+                    outbox.put(END)
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    for index, (_, workers) in enumerate(stages):
+        threads.extend(threading.Thread(target=work, args=(index,), daemon=True)
+                       for _ in range(workers))
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            result = results.get()
+            if result is END:
+                break
+            yield result
+        if errors:
+            raise errors[0]
+    finally:
+        stopped.set()
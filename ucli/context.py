@@ -0,0 +1,77 @@
+'''
+The API clients handed to commands through the click context.
+
+Clients are only built once a command actually runs so that help
+and usage errors never import the HTTP stack (requests is slow to import).
+'''
+from functools import update_wrapper
+
+import click
+
+
+class ApiFactory(object):
+    '''
+    Build the context `Api` on first use from the root command options,
+    ``setup`` being called with the new client (ie. to display its statistics).
+    '''
+    def __init__(self, root, token, setup=None, **kwargs):
+        self.root = root
+        self.token = token
+        self.setup = setup
+        self.kwargs = kwargs
+        self.api = None
+
+    def get(self):
+        if self.api is None:
+            from .api import Api  # Deferred as requests is slow to import
+            self.api = Api(self.root, self.token, **self.kwargs)
+            if self.setup:
+                self.setup(self.api)
+        return self.api
+
+    def get_async(self):
+        '''A new `AsyncApi` with the same options, to be closed within its event loop'''
+        from .aio import AsyncApi
+        api = AsyncApi(self.root, self.token, **self.kwargs)
+        if self.setup:
+            self.setup(api)
+        return api
+
+    def close(self):
+        if self.api is not None:
+            self.api.close()
+
+
+def pass_api(f):
+    '''Pass the context `Api` as first argument, building it on first use'''
+    @click.pass_context
+    def new_func(ctx, *args, **kwargs):
+        factory = ctx.find_object(ApiFactory)
+        if factory is None:
+            raise RuntimeError('Managed to invoke callback without a context object '
+                               'of type ApiFactory existing')
+        return ctx.invoke(f, factory.get(), *args, **kwargs)
+    return update_wrapper(new_func, f)
+
+
+def pass_async_api(f):
+    '''
+    The asyncio counterpart of `pass_api`, to decorate ``async def`` commands.
+
+    The coroutine receives an `AsyncApi` sharing the context `Api` options
+    and is run to completion in its own event loop.
+    '''
+    @click.pass_context
+    def new_func(ctx, *args, **kwargs):
+        factory = ctx.find_object(ApiFactory)
+        if factory is None:
+            raise RuntimeError('Managed to invoke callback without a context object '
+                               'of type ApiFactory existing')
+
+        async def run():
+            async with factory.get_async() as api:
+                return await f(api, *args, **kwargs)
+
+        import asyncio  # Deferred as it is slow to import
+        return asyncio.run(run())
+    return update_wrapper(new_func, f)
@@ -0,0 +1,135 @@
+'''
+Run a command against several udata instances at once.
+
+Each instance is handled by its own ``ucli`` child process receiving its URL,
+token and name through the ``UDATA_URL``, ``UDATA_TOKEN`` and ``UCLI_INSTANCE``
+environment variables. Files written by children (see ``InstancePath``) get
+the instance name inserted before their extensions.
+Children run in parallel, their output is displayed grouped by instance as soon
+as they are done, followed by a combined summary.
+'''
+import configparser
+import os
+import subprocess
+import sys
+import time
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import click
+
+from .utils import echo, header, exit, green, red, white, yellow, OK, KO, WARNING, INSTANCE_ENVVAR
+
+Instance = namedtuple('Instance', ('name', 'url', 'token'))
+Result = namedtuple('Result', ('instance', 'code', 'output', 'duration'))
+
+#: Root options handled by the parent process, not forwarded to children
+FANOUT_OPTIONS = ('--url', '--token', '--instances')
+
+#: Environment variables which must not be inherited by children
+FANOUT_ENVVARS = ('UDATA_URL', 'UDATA_TOKEN', 'UDATA_INSTANCES', INSTANCE_ENVVAR)
+
+
+def read_instances(filename):
+    '''
+    Read an instances file, an INI file with a section per instance:
+
+    .. code-block:: ini
+
+        [production]
+        url = https://www.data.gouv.fr
+        token = xyz123
+    '''
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        with open(filename, encoding='utf8') as f:
+            parser.read_file(f)
+    except (OSError, configparser.Error) as e:
+        exit('Unable to read instances file {0}'.format(filename), str(e))
+    instances = []
+    for name in parser.sections():
+        section = parser[name]
+        if 'url' not in section:
+            exit('Instance "{0}" has no url in {1}'.format(name, filename))
+        instances.append(Instance(name, section['url'], section.get('token') or None))
+    if not instances:
+        exit('No instance found in {0}'.format(filename))
+    return instances
+
+
+def pair_instances(urls, tokens):
+    '''Pair ``--url`` and ``--token`` values, a single token being used for all URLs'''
+    if len(tokens) > 1 and len(tokens) != len(urls):
+        raise click.BadParameter('expected a single token or one per --url '
+                                 '({0} tokens for {1} URLs)'.format(len(tokens), len(urls)),
+                                 param_hint='--token')
+    if len(tokens) <= 1:
+        tokens = [tokens[0] if tokens else None] * len(urls)
+    return [Instance(urlsplit(url).netloc or url, url, token) for url, token in zip(urls, tokens)]
+
+
+def child_args(args):
+    '''Strip the fan-out options from the root ``args`` (before the subcommand)'''
+    stripped = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in FANOUT_OPTIONS:
+            skip = True  # Skip its value too
+        elif not arg.startswith(tuple(option + '=' for option in FANOUT_OPTIONS)):
+            stripped.append(arg)
+    return stripped
+
+
+def run_instance(instance, args, stdin):
+    env = {key: value for key, value in os.environ.items() if key not in FANOUT_ENVVARS}
+    env['UDATA_URL'] = instance.url
+    env[INSTANCE_ENVVAR] = instance.name  # Makes the written files paths unique per instance
+    if instance.token:
+        env['UDATA_TOKEN'] = instance.token
+    start = time.monotonic()
+    process = subprocess.run([sys.executable, '-m', 'ucli'] + args, env=env,
+                             input=stdin if stdin is not None else '',
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                             encoding='utf8', errors='replace')
+    return Result(instance, process.returncode, process.stdout, time.monotonic() - start)
+
+
+def last_line(output):
+    lines = [line.strip() for line in output.splitlines() if line.strip()]
+    return lines[-1] if lines else ''
+
+
+def fanout(instances, args, stdin=None):
+    '''
+    Run ``ucli args`` against all ``instances`` in parallel, returns the worst exit code.
+
+    ``stdin`` (ie. prompts answers) is fed to each child, otherwise prompts abort.
+    '''
+    if stdin is None:
+        echo(' '.join((yellow(WARNING), 'No answers piped on stdin, any prompt will abort '
+                                        '(use --force when available or pipe the answers)')))
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(instances)) as executor:
+        futures = [executor.submit(run_instance, instance, args, stdin) for instance in instances]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result.instance] = result
+            header('{0} ({1})'.format(result.instance.name, result.instance.url))
+            echo(result.output.rstrip('\n'))
+            echo('')
+
+    header('Instances summary')
+    width = max(len(instance.name) for instance in instances)
+    for instance in instances:
+        result = results[instance]
+        line = last_line(result.output)
+        if result.code:
+            line = 'exit code {0}: {1}'.format(result.code, line)
+        status = green(OK) if result.code == 0 else red(KO)
+        echo('{0} {1} {2:>7.1f}s  {3}'.format(status, white(instance.name.ljust(width)),
+                                              result.duration, line))
+    return max((results[instance].code for instance in instances), key=abs)
@@ -0,0 +1,121 @@
+'''
+A persistent HTTP cache for ``GET`` API calls.
+
+Responses are stored with their ``ETag`` and ``Last-Modified`` validators
+and revalidated with conditional requests. Responses carrying a
+``Cache-Control: max-age`` are served locally while fresh.
+'''
+import logging
+import re
+import threading
+import time
+
+import requests
+
+from requests.structures import CaseInsensitiveDict
+
+from .cache import DiskCache
+
+log = logging.getLogger(__name__)
+
+#: Response headers kept in cache
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control')
+
+RE_MAX_AGE = re.compile(r'max-age=(\d+)')
+
+
+def stored_headers(response):
+    return {h: response.headers[h] for h in STORED_HEADERS if h in response.headers}
+
+
+def max_age(headers):
+    match = RE_MAX_AGE.search(headers.get('Cache-Control', ''))
+    return int(match.group(1)) if match else 0
+
+
+class HttpCache(object):
+    '''
+    Counts responses served locally (``hits``), after a ``304`` (``revalidated``)
+    and fetched again (``misses``).
+    '''
+    def __init__(self, path, max_size):
+        self.store = DiskCache(path, max_size)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def as_dict(self):
+        with self.lock:
+            return {'hits': self.hits, 'revalidated': self.revalidated, 'misses': self.misses}
+
+    def key(self, url, params, headers):
+        params = '&'.join('{0}={1}'.format(k, v) for k, v in sorted((params or {}).items()))
+        return '|'.join((url, params, headers.get('X-Fields') or ''))
+
+    def get(self, api, path, params=None, headers=None):
+        '''Perform a ``GET`` request through the cache, returns a ``requests.Response``'''
+        url = api.url(path)
+        headers = dict(headers or {})
+        key, entry, cached = self.prepare(url, params, headers)
+        if cached is not None:
+            return cached
+        response = api.request('GET', path, params=params, headers=headers)
+        return self.update(url, key, entry, response)
+
+    def prepare(self, url, params, headers):
+        '''
+        Look a request up, returns its cache key, its stored entry if any
+        and its cached response if still fresh. The ``headers`` of a request
+        to send are completed with the stored validators.
+        '''
+        key = self.key(url, params, headers)
+        entry = self.store.get(key)
+        if entry:
+            if time.time() < entry['stored'] + max_age(entry['headers']):
+                self.count('hits')
+                return key, entry, self.to_response(url, entry)
+            if 'ETag' in entry['headers']:
+                headers['If-None-Match'] = entry['headers']['ETag']
+            if 'Last-Modified' in entry['headers']:
+                headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        return key, entry, None
+
+    def update(self, url, key, entry, response):
+        '''Store the server ``response`` to a prepared request, returns the response to use'''
+        if entry and response.status_code == 304:
+            self.count('revalidated')
+            entry['stored'] = time.time()
+            entry['headers'].update(stored_headers(response))
+            self.store.set(key, entry)
+            return self.to_response(url, entry)
+        self.count('misses')
+        if response.status_code == 200 and self.cacheable(response):
+            self.store.set(key, {
+                'stored': time.time(),
+                'headers': stored_headers(response),
+                'body': response.text,
+            })
+        return response
+
+    def cacheable(self, response):
+        cache_control = response.headers.get('Cache-Control', '')
+        if 'no-store' in cache_control:
+            return False
+        validators = any(h in response.headers for h in ('ETag', 'Last-Modified'))
+        return validators or max_age(response.headers) > 0
+
+    def to_response(self, url, entry):
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = url
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = 'utf-8'
+        response._content = entry['body'].encode('utf-8')
+        response.from_cache = True
+        return response
@@ -0,0 +1,227 @@
+'''
+A local SQLite index of the catalog metadata.
+
+The ``sync`` command mirrors organizations, users, datasets and reuses headers
+into a SQLite database, one per instance and token (like the other local caches).
+Syncs are incremental: only the objects modified since the most recent one
+already indexed are fetched. Users have no modification date and are always
+fetched again.
+
+With ``--index``, commands resolve IDs and names from the index first
+and fall back to the API on misses.
+'''
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .suggest import normalize
+
+log = logging.getLogger(__name__)
+
+
+class Kind(object):
+    '''
+    An indexed object kind: its list ``endpoint``, its indexed ``fields``,
+    the ``references`` fields holding another object (stored as its ID)
+    and the ``modified`` field objects are synced by, incrementally unless
+    ``incremental`` is false.
+    '''
+    def __init__(self, name, fields, display, references=(), modified='last_modified',
+                 incremental=True):
+        self.name = name
+        self.fields = fields
+        self.display = display
+        self.references = references
+        self.modified = modified
+        self.incremental = incremental
+
+    @property
+    def endpoint(self):
+        return '{0}/'.format(self.name)
+
+    @property
+    def columns(self):
+        return ('id',) + self.fields + (self.modified,)
+
+    @property
+    def projection(self):
+        '''X-Fields projection of the indexed fields'''
+        return ','.join('{0}{{id}}'.format(c) if c in self.references else c for c in self.columns)
+
+    def row(self, item):
+        values = []
+        for column in self.columns:
+            value = item.get(column)
+            if column in self.references:
+                value = (value or {}).get('id')
+            values.append(value)
+        search = ' '.join(str(item.get(c) or '') for c in ('slug',) + self.display)
+        values.append(normalize(search))
+        return values
+
+    def item(self, row):
+        '''Rebuild an API like item from an indexed row'''
+        item = dict(zip(self.columns, row))
+        for column in self.references:
+            item[column] = {'id': item[column]} if item[column] else None
+        return item
+
+
+KINDS = {kind.name: kind for kind in (
+    Kind('organizations', ('slug', 'name'), display=('name',)),
+    # Users have no modification date, their changes are only seen by full syncs
+    Kind('users', ('slug', 'first_name', 'last_name'), display=('first_name', 'last_name'),
+         modified='created', incremental=False),
+    Kind('datasets', ('slug', 'title', 'owner', 'organization'), display=('title',),
+         references=('owner', 'organization')),
+    Kind('reuses', ('slug', 'title', 'owner', 'organization'), display=('title',),
+         references=('owner', 'organization')),
+)}
+
+#: Number of items fetched per page by syncs
+SYNC_PAGE_SIZE = 100
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def index_path(api):
+    return os.path.join(api.cache_dir, 'index', api.cache_namespace + '.sqlite')
+
+
+class Index(object):
+    '''
+    The SQLite index, usable from several threads
+    (each one gets its own connection).
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    @property
+    def db(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = self.local.db = sqlite3.connect(self.path, timeout=30)
+            db.execute('PRAGMA journal_mode=WAL')
+            self.create_schema(db)
+        return db
+
+    def create_schema(self, db):
+        with db:
+            for kind in KINDS.values():
+                columns = ', '.join(c + (' TEXT PRIMARY KEY' if c == 'id' else ' TEXT')
+                                    for c in kind.columns)
+                db.execute('CREATE TABLE IF NOT EXISTS {0} ({1}, search TEXT)'.format(
+                    kind.name, columns))
+            db.execute('CREATE TABLE IF NOT EXISTS syncs (kind TEXT PRIMARY KEY, synced_at TEXT)')
+
+    def close(self):
+        db = getattr(self.local, 'db', None)
+        if db is not None:
+            db.close()
+            self.local.db = None
+
+    def get(self, kind, id):
+        '''An indexed object as an API like item, ``None`` if not indexed'''
+        kind = KINDS[kind]
+        sql = 'SELECT {0} FROM {1} WHERE id = ?'.format(', '.join(kind.columns), kind.name)
+        row = self.db.execute(sql, (id,)).fetchone()
+        return kind.item(row) if row else None
+
+    def search(self, kind, q, size):
+        '''
+        Indexed objects whose ID is ``q`` or whose slug or name contain all its terms,
+        the shortest (closest) matches first.
+        '''
+        kind = KINDS[kind]
+        terms = normalize(q).split()
+        if not terms:
+            return []
+        where = ' AND '.join("search LIKE ? ESCAPE '\\'" for _ in terms)
+        params = ['%{0}%'.format(t.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+                  for t in terms]
+        sql = 'SELECT {0} FROM {1} WHERE id = ? OR ({2}) ORDER BY length(search) LIMIT ?'.format(
+            ', '.join(kind.columns), kind.name, where)
+        rows = self.db.execute(sql, [q.strip()] + params + [size]).fetchall()
+        return [kind.item(row) for row in rows]
+
+    def count(self, kind):
+        return self.db.execute('SELECT count(*) FROM {0}'.format(kind)).fetchone()[0]
+
+    def last_sync(self, kind):
+        row = self.db.execute('SELECT synced_at FROM syncs WHERE kind = ?', (kind,)).fetchone()
+        return row[0] if row else None
+
+    def watermark(self, kind):
+        '''The most recent modification date indexed for ``kind``'''
+        kind = KINDS[kind]
+        sql = 'SELECT max({0}) FROM {1}'.format(kind.modified, kind.name)
+        return self.db.execute(sql).fetchone()[0]
+
+    def upsert(self, kind, items):
+        kind = KINDS[kind]
+        with self.db as db:
+            db.executemany('INSERT OR REPLACE INTO {0} ({1}, search) VALUES ({2})'.format(
+                kind.name, ', '.join(kind.columns), ', '.join('?' * (len(kind.columns) + 1))),
+                [kind.row(item) for item in items])
+
+    def drop_unseen(self, kind, seen):
+        '''Delete the ``kind`` objects whose ID is not in ``seen``'''
+        with self.db as db:
+            ids = [row[0] for row in db.execute('SELECT id FROM {0}'.format(kind))]
+            db.executemany('DELETE FROM {0} WHERE id = ?'.format(kind),
+                           [(id,) for id in ids if id not in seen])
+
+    def sync(self, api, kind, full=False, page_size=SYNC_PAGE_SIZE):
+        '''
+        Fetch the ``kind`` objects modified since the last sync, most recent first,
+        or all of them with ``full`` or for non incremental kinds
+        (dropping the objects deleted since, once all of them have been fetched
+        so an interrupted full sync leaves the index untouched).
+        Returns the number of objects fetched.
+        '''
+        kind = KINDS[kind]
+        full = full or not kind.incremental
+        synced_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        watermark = None if full else self.watermark(kind.name)
+        items = api.paginate(kind.endpoint, fields=kind.projection, page_size=page_size,
+                             prefetch=True, sort='-{0}'.format(kind.modified))
+        seen = set()
+        count = 0
+        batch = []
+        for item in items:
+            if watermark and (item.get(kind.modified) or '') < watermark:
+                break  # Older ones are already indexed
+            batch.append(item)
+            seen.add(item['id'])
+            if len(batch) >= page_size:
+                self.upsert(kind.name, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self.upsert(kind.name, batch)
+            count += len(batch)
+        if full:
+            self.drop_unseen(kind.name, seen)
+        with self.db as db:
+            db.execute('INSERT OR REPLACE INTO syncs (kind, synced_at) VALUES (?, ?)',
+                       (kind.name, synced_at))
+        return count
+
+
+def open_index(api):
+    '''The index of an API instance and token'''
+    path = index_path(api)
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = Index(path)
+        return _indexes[path]
+
+
+def get_index(api):
+    '''The index to resolve IDs and names from, ``None`` unless enabled with ``--index``'''
+    return open_index(api) if api.options.get('index') else None
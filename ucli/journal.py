@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+
+DONE = 'done'
+FAILED = 'failed'
+PENDING = 'pending'
+
+
+class Journal(object):
+    '''
+    An append-only JSON lines journal of bulk operations outcomes.
+
+    Each entry records a row ``key``, its ``status`` and some optional extra data.
+    The last entry for a given key wins so reopening an existing journal
+    allows a rerun to skip the rows already done.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        needs_newline = False
+        if os.path.exists(path):
+            with open(path, encoding='utf8') as f:
+                for line in f:
+                    needs_newline = not line.endswith('\n')
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:  # Truncated by a crash
+                        continue
+                    self.entries[entry['key']] = entry
+        self.file = open(path, 'a', encoding='utf8')
+        if needs_newline:
+            self.file.write('\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def is_done(self, key):
+        entry = self.entries.get(key)
+        return entry is not None and entry['status'] == DONE
+
+    def record(self, key, status, **extra):
+        entry = dict(extra, key=key, status=status)
+        line = json.dumps(entry)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+            self.entries[key] = entry
+
+    def close(self):
+        self.file.close()
+
+
+class NullJournal(object):
+    '''A journal recording nothing, used when no journal file is given'''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def __len__(self):
+        return 0
+
+    def get(self, key):
+        return None
+
+    def is_done(self, key):
+        return False
+
+    def record(self, key, status, **extra):
+        pass
+
+    def close(self):
+        pass
+
+
+def open_journal(path=None):
+    return Journal(path) if path else NullJournal()
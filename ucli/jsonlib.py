@@ -0,0 +1,89 @@
+'''
+JSON encoding and decoding using the fastest available backend.
+
+``orjson`` or ``ujson`` are used when installed (``pip install udata-cli[speedups]``),
+the standard library ``json`` module otherwise.
+Large list responses can be parsed incrementally with the optional ``ijson``.
+'''
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+if orjson is not None:
+    BACKEND = 'orjson'
+
+    def loads(data):
+        '''Decode a JSON document from ``str`` or ``bytes``'''
+        return orjson.loads(data)
+
+    def dumps(obj):
+        '''Encode ``obj`` as a compact unicode JSON string'''
+        return orjson.dumps(obj).decode('utf8')
+
+elif ujson is not None:
+    BACKEND = 'ujson'
+
+    def loads(data):
+        '''Decode a JSON document from ``str`` or ``bytes``'''
+        return ujson.loads(data)
+
+    def dumps(obj):
+        '''Encode ``obj`` as a compact unicode JSON string'''
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False)
+
+else:
+    BACKEND = 'json'
+
+    def loads(data):
+        '''Decode a JSON document from ``str`` or ``bytes``'''
+        return json.loads(data)
+
+    def dumps(obj):
+        '''Encode ``obj`` as a compact unicode JSON string'''
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+SCALAR_EVENTS = ('null', 'boolean', 'number', 'string')
+
+#: Whether list pages can be parsed while being downloaded
+INCREMENTAL = ijson is not None
+
+
+def iter_items(fileobj, meta, prefix='data'):
+    '''
+    Incrementally parse a list page from ``fileobj``, yielding
+    each item of the ``prefix`` array as soon as it has been read.
+
+    The page top-level scalars (ie. ``total`` or ``next_page``)
+    are stored into the ``meta`` dictionary as they are met,
+    so they are only all known once the page is exhausted.
+    '''
+    item_prefix = prefix + '.item'
+    builder = None
+    for path, event, value in ijson.parse(fileobj, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if path == item_prefix and event in ('end_map', 'end_array'):
+                yield builder.value
+                builder = None
+        elif path == item_prefix:
+            if event in ('start_map', 'start_array'):
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            else:
+                yield value
+        elif path and '.' not in path and event in SCALAR_EVENTS:
+            meta[path] = value
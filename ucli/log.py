@@ -1,10 +1,34 @@
+import copy
+import json
 import logging
+import queue
+import threading
+import time
+
+from collections import namedtuple
+from datetime import datetime
+from itertools import groupby
 
 import click
 
+from .trace import span
+
 from .utils import color, yellow, red, cyan, white, ARROW, MAGNIFYING_GLASS, WARNING
 
 
+LOG_FORMATS = ('text', 'json')
+
+#: Maximum number of records written at once
+BATCH_SIZE = 500
+
+#: Minimum delay in seconds between two redraws of the live status line
+STATUS_INTERVAL = .1
+
+#: Minimum delay in seconds between two status lines when the output is not a terminal
+STATUS_LINE_INTERVAL = 5
+
+CLEAR_LINE = '\r\x1b[K'
+
 LEVEL_COLORS = {
     logging.WARNING: yellow,
     logging.ERROR: red,
@@ -31,29 +55,230 @@ class CliFormatter(logging.Formatter):
             return ': '.join((color(record.levelname.lower()), msg))
 
 
+class JsonFormatter(logging.Formatter):
+    '''Convert a `logging.LogRecord` object into a JSON line'''
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        details = getattr(record, 'details', None)
+        if details:
+            data['details'] = details
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
 class CliHandler(logging.Handler):
     '''
     Log using ``click.echo``
     Support an optionnal ``record.details`` attribute.
     '''
+    def render(self, record):
+        '''The ``(text, err)`` chunks displaying a record'''
+        err = record.levelno >= logging.WARNING
+        chunks = [(self.format(record), err)]
+        details = getattr(record, 'details', None)
+        if details:
+            chunks.append((details, err))
+        return chunks
+
     def emit(self, record):
         try:
-            msg = self.format(record)
-            err = record.levelno >= logging.WARNING
-            click.echo(msg, err=err)
-            details = getattr(record, 'details', None)
-            if details:
-                click.echo(details)
+            with span(record.levelname.lower(), 'log'):
+                for text, err in self.render(record):
+                    click.echo(text, err=err)
         except (KeyboardInterrupt, SystemExit):
             raise
         except Exception:
             self.handleError(record)
 
 
-def init_logging(verbose=False):
+class JsonHandler(CliHandler):
+    '''Log JSON lines on stderr, keeping stdout for the commands output'''
+    def render(self, record):
+        return [(self.format(record), True)]
+
+
+StatusUpdate = namedtuple('StatusUpdate', ('text', 'final'))
+
+
+class AsyncHandler(logging.Handler):
+    '''
+    Queue records and write them from a background thread.
+
+    ``emit`` only enqueues records so logging never blocks the workers,
+    their message being merged first (see `prepare`).
+    The writer thread renders them with the ``target`` handler and writes
+    consecutive chunks for the same stream at once, with a single flush.
+
+    In ``progress`` mode, only warnings and errors are displayed and
+    the thread also owns a live status line (see `set_status`),
+    cleared before writing records and redrawn after.
+    '''
+    def __init__(self, target, progress=False, batch_size=BATCH_SIZE):
+        super(AsyncHandler, self).__init__(logging.WARNING if progress else logging.NOTSET)
+        self.target = target
+        self.progress = progress
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.status = None
+        self.status_drawn = False
+        self.last_draw = 0
+        self.live = click.get_text_stream('stderr').isatty()
+        self.thread = threading.Thread(target=self.run, name='ucli-log', daemon=True)
+        self.thread.start()
+
+    def prepare(self, record):
+        '''
+        A copy of ``record`` with its message merged with its arguments,
+        so logged objects changed after the call are displayed as they were.
+        '''
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def set_status(self, text, final=False):
+        '''Replace the live status line, a ``final`` status is kept as a regular line'''
+        self.queue.put(StatusUpdate(text, final))
+
+    def flush(self):
+        '''Wait for all the queued records to be written'''
+        if self.thread.is_alive() and threading.current_thread() is not self.thread:
+            self.queue.join()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        super(AsyncHandler, self).close()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with span('write logs', 'log', records=len(batch)):
+                    self.write(batch)
+            except Exception:
+                # Never let a broken stream kill the writer thread and block flushes
+                for item in batch:
+                    if isinstance(item, logging.LogRecord):
+                        self.handleError(item)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if any(item is None for item in batch):
+                return
+
+    def write(self, batch):
+        chunks = []
+        final = None
+        for item in batch:
+            if item is None:
+                continue
+            elif isinstance(item, StatusUpdate):
+                if item.final:
+                    final = item.text
+                    self.status = None
+                else:
+                    self.status = item.text
+                continue
+            try:
+                chunks.extend(self.target.render(item))
+            except Exception:
+                self.handleError(item)
+        if final:
+            chunks.append((final, True))
+        if chunks:
+            self.clear_status()
+            for err, group in groupby(chunks, key=lambda chunk: chunk[1]):
+                click.echo('\n'.join(text for text, _ in group), err=err)
+        self.draw_status(force=bool(chunks))
+
+    def clear_status(self):
+        if self.status_drawn:
+            click.echo(CLEAR_LINE, nl=False, err=True)
+            self.status_drawn = False
+
+    def draw_status(self, force=False):
+        if not self.status:
+            return
+        now = time.monotonic()
+        if not self.live:
+            if now - self.last_draw >= STATUS_LINE_INTERVAL:
+                self.last_draw = now
+                click.echo(self.status, err=True)
+        elif force or now - self.last_draw >= STATUS_INTERVAL:
+            self.last_draw = now
+            click.echo(CLEAR_LINE + self.status, nl=False, err=True)
+            self.status_drawn = True
+
+
+class BufferedLogger(object):
+    '''
+    A minimal logger collecting records instead of emitting them.
+
+    Concurrent workers log into their own buffer which is replayed
+    in the main thread so the output stays ordered and deterministic.
+    '''
+    def __init__(self):
+        self.records = []
+
+    def log(self, level, msg, *args, **kwargs):
+        self.records.append((level, msg, args, kwargs))
+
+    def debug(self, msg, *args, **kwargs):
+        self.log(logging.DEBUG, msg, *args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self.log(logging.INFO, msg, *args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self.log(logging.WARNING, msg, *args, **kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        self.log(logging.ERROR, msg, *args, **kwargs)
+
+    def replay(self, logger):
+        for level, msg, args, kwargs in self.records:
+            logger.log(level, msg, *args, **kwargs)
+        self.records = []
+
+
+def status_handler():
+    '''The handler displaying the live status line, ``None`` if not in progress mode'''
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, AsyncHandler) and handler.progress:
+            return handler
+
+
+def init_logging(verbose=False, fmt='text', progress=False):
     logger = logging.getLogger()
-    handler = CliHandler()
-    handler.setFormatter(CliFormatter())
-    logger.addHandler(handler)
+    for handler in list(logger.handlers):  # Already initialized (ie. by a previous invocation)
+        if isinstance(handler, (CliHandler, AsyncHandler)):
+            logger.removeHandler(handler)
+            handler.close()
+    if fmt == 'json':
+        target = JsonHandler()
+        target.setFormatter(JsonFormatter())
+    else:
+        target = CliHandler()
+        target.setFormatter(CliFormatter())
+    logger.addHandler(AsyncHandler(target, progress=progress))
 
     logger.setLevel(logging.DEBUG if verbose else logging.INFO)
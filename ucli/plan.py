@@ -0,0 +1,166 @@
+'''
+Transfer plans: the validated transfers a bulk command is about to perform.
+
+A plan is a JSON lines file. Its first line is a header describing the transfers
+(subject and recipient classes, reason...) and each following line is a transfer.
+Planning and applying are separate steps so a plan can be reviewed before any
+mutation and applying it does not require to fetch items and recipients again.
+'''
+import logging
+import time
+
+from collections import Counter
+
+from . import jsonlib
+from .concurrency import imap
+from .journal import DONE, FAILED, PENDING
+from .log import BufferedLogger
+from .progress import Progress
+from .utils import exit
+
+log = logging.getLogger(__name__)
+
+PLAN_VERSION = 1
+
+# Transfers outcomes
+TRANSFERED = 'transfered'
+SKIPPED = 'skipped'
+RESUMED = 'resumed'
+
+ACCEPT_COMMENT = 'Automatically accepted by udata-cli'
+
+
+def plan_header(subject, recipient, comment, source=None):
+    '''The plan header, ``subject`` and ``recipient`` being the transfered objects classes'''
+    return {
+        'plan': PLAN_VERSION,
+        'subject': subject,
+        'recipient': recipient,
+        'comment': comment,
+        'source': source,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def plan_entry(line, subject, recipient):
+    '''A single transfer of the ``subject`` item to the ``recipient`` (with its display ``name``)'''
+    return {
+        'line': line,
+        'id': subject['id'],
+        'title': subject.get('title'),
+        'recipient': recipient['id'],
+        'name': recipient_name(recipient),
+    }
+
+
+def recipient_name(recipient):
+    if 'name' in recipient:
+        return recipient['name']
+    return '{first_name} {last_name}'.format(**recipient)
+
+
+def journal_key(entry):
+    '''Same key as `dispatch` rows so a journal can be shared between planning and applying'''
+    return '{line}:{id}:{recipient}'.format(**entry)
+
+
+def write_plan(path, header, transfers):
+    '''Write the ``header`` and stream ``transfers`` into ``path``, returns their number'''
+    count = 0
+    with open(path, 'w', encoding='utf8') as f:
+        f.write(jsonlib.dumps(header) + '\n')
+        for entry in transfers:
+            f.write(jsonlib.dumps(entry) + '\n')
+            count += 1
+    return count
+
+
+def read_plan(path):
+    '''Read a plan file, returns its header, its number of transfers and a transfers iterator'''
+    with open(path, encoding='utf8') as f:
+        try:
+            header = jsonlib.loads(f.readline())
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or 'plan' not in header:
+            exit('{0} is not a transfer plan'.format(path))
+        if header['plan'] != PLAN_VERSION:
+            exit('Unsupported plan version {0}'.format(header['plan']),
+                 'This plan has been created by another udata-cli version')
+        count = sum(1 for line in f if line.strip())
+
+    def transfers():
+        with open(path, encoding='utf8') as f:
+            f.readline()  # Skip header
+            for line in f:
+                if line.strip():
+                    yield jsonlib.loads(line)
+
+    return header, count, transfers()
+
+
+def transfer(api, header, entry, journal, log):
+    '''Perform a single planned transfer, returns its outcome'''
+    key = journal_key(entry)
+    state = journal.get(key) or {}
+    if state.get('status') == DONE:
+        log.debug('Line %s already processed', entry['line'])
+        return RESUMED
+    label = header['subject'].lower()
+
+    transfer_id = state.get('transfer')
+    if transfer_id:
+        log.debug('Reusing transfer %s from the journal', transfer_id)
+    else:
+        log.info('Transfering %s %s (%s) to %s', label, entry['title'], entry['id'], entry['name'])
+        request_response = api.post('transfer/', {
+            'comment': header['comment'],
+            'recipient': {'class': header['recipient'], 'id': entry['recipient']},
+            'subject': {'class': header['subject'], 'id': entry['id']}
+        }, allow_failure=True)
+        if hasattr(request_response, 'error_details'):
+            log.warning('Unable to request %s %s (%s) transfer to %s: %s', label,
+                        entry['title'], entry['id'], entry['name'], request_response.error_details)
+            journal.record(key, FAILED)
+            return FAILED
+        transfer_id = request_response['id']
+        journal.record(key, PENDING, transfer=transfer_id)
+
+    accept_reponse = api.post('transfer/{id}/'.format(id=transfer_id), {
+        'response': 'accept',
+        'comment': ACCEPT_COMMENT,
+    }, allow_failure=True)
+    if hasattr(accept_reponse, 'error_details'):
+        log.warning('Unable to complete %s %s transfer to (%s) to %s: %s',
+                    label, entry['title'], entry['id'], entry['name'], accept_reponse.error_details)
+        journal.record(key, FAILED, transfer=transfer_id)
+        return FAILED
+    log.info('Transfered %s %s (%s) to %s', label, entry['title'], entry['id'], entry['name'])
+    journal.record(key, DONE, transfer=transfer_id)
+    return TRANSFERED
+
+
+def apply_plan(api, header, transfers, journal, concurrency=1, total=None):
+    '''Perform all the planned ``transfers`` (``total`` if known), returns their outcomes counts'''
+    def transfer_buffered(entry):
+        buffer = BufferedLogger()
+        return transfer(api, header, entry, journal, buffer), buffer
+
+    outcomes = Counter()
+    progress = Progress(total, unit='transfers')
+    if concurrency > 1:
+        if concurrency > api.pool_maxsize:
+            log.warning('Concurrency (%s) is higher than the connection pool size (%s), '
+                        'consider raising --pool-maxsize', concurrency, api.pool_maxsize)
+        # Workers output is buffered and replayed in plan order
+        for outcome, buffer in imap(transfer_buffered, transfers, workers=concurrency):
+            buffer.replay(log)
+            outcomes[outcome] += 1
+            progress.advance(failed=outcome == FAILED)
+    else:
+        for entry in transfers:
+            outcome = transfer(api, header, entry, journal, log)
+            outcomes[outcome] += 1
+            progress.advance(failed=outcome == FAILED)
+    progress.summary()
+    return outcomes
@@ -0,0 +1,88 @@
+import logging
+import time
+
+from datetime import timedelta
+
+from .log import status_handler
+
+log = logging.getLogger(__name__)
+
+#: Minimum delay in seconds between two progress reports
+DEFAULT_INTERVAL = 5
+
+#: Number of characters of the progress bar
+BAR_WIDTH = 30
+
+
+class Progress(object):
+    '''
+    Track a bulk operation progress and periodically log its rate and ETA.
+
+    ``total`` may be ``None`` if unknown, in which case there is no ETA.
+    In progress mode (``--progress``), a live progress bar is displayed instead.
+    '''
+    def __init__(self, total=None, unit='items', interval=DEFAULT_INTERVAL):
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.bar = status_handler()
+        self.start = self.last_report = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    @property
+    def rate(self):
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed else 0.
+
+    @property
+    def eta(self):
+        rate = self.rate
+        if self.total is None or not rate:
+            return None
+        return max(0, self.total - self.done) / rate
+
+    def advance(self, count=1, failed=False):
+        self.done += count
+        if failed:
+            self.failed += count
+        if self.bar:
+            self.bar.set_status(self.progress_bar())
+            return
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def status(self):
+        parts = []
+        if self.total:
+            parts.append('{0}/{1} ({2:.1%})'.format(self.done, self.total, self.done / self.total))
+        else:
+            parts.append(str(self.done))
+        if self.failed:
+            parts.append('{0} failed'.format(self.failed))
+        parts.append('{0:.1f} {1}/s'.format(self.rate, self.unit))
+        eta = self.eta
+        if eta is not None and self.done < self.total:
+            parts.append('ETA {0}'.format(timedelta(seconds=round(eta))))
+        return ' - '.join(parts)
+
+    def progress_bar(self):
+        if not self.total:
+            return self.status()
+        filled = int(BAR_WIDTH * min(1, self.done / self.total))
+        return '[{0}{1}] {2}'.format('#' * filled, '.' * (BAR_WIDTH - filled), self.status())
+
+    def report(self):
+        log.info('Progress: %s', self.status())
+
+    def summary(self):
+        if self.bar:
+            self.bar.set_status(self.progress_bar(), final=True)
+        log.info('Processed %s %s in %s (%.1f %s/s)', self.done, self.unit,
+                 timedelta(seconds=round(self.elapsed)), self.rate, self.unit)
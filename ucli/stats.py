@@ -0,0 +1,164 @@
+'''
+API calls instrumentation.
+
+Calls are aggregated by method and endpoint template,
+ie. the path relative to the API root with identifiers replaced by ``{id}``.
+Calls served by the HTTP cache are counted apart.
+'''
+import json
+import math
+import re
+import threading
+import time
+
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+from .utils import echo, header, white
+
+RE_ID = re.compile(r'^(?:[0-9a-f]{24}'  # ObjectId
+                   r'|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'  # UUID
+                   r'|\d+)$')
+
+#: Path segments which are never identifiers
+ACTIONS = ('suggest',)
+
+PERCENTILES = (50, 95, 99)
+
+
+def endpoint_template(url, root):
+    '''Turn an API URL into its endpoint template, ie. ``datasets/{id}/``'''
+    path = urlsplit(url).path
+    root_path = urlsplit(root).path
+    if path.startswith(root_path):
+        path = path[len(root_path):]
+    segments = path.split('/')
+    for index, segment in enumerate(segments):
+        if not segment or segment in ACTIONS:
+            continue
+        if index % 2 or RE_ID.match(segment):  # collection/{id}/collection/{id}...
+            segments[index] = '{id}'
+    return '/'.join(segments)
+
+
+def endpoint_key(method, url, root):
+    '''The key calls are aggregated by, ie. ``GET datasets/{id}/``'''
+    return ' '.join((method, endpoint_template(url, root)))
+
+
+def percentile(values, p):
+    '''Nearest-rank percentile of sorted ``values``'''
+    if not values:
+        return None
+    rank = max(0, min(len(values) - 1, math.ceil(p * len(values) / 100.) - 1))
+    return values[rank]
+
+
+class EndpointStats(object):
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.bytes_wire = 0
+        self.latencies = []
+        self.statuses = Counter()
+
+    def as_dict(self):
+        latencies = sorted(self.latencies)
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'bytes_wire': self.bytes_wire,
+            'statuses': {str(k): v for k, v in self.statuses.items()},
+            'latency': dict(
+                (('p{0}'.format(p), percentile(latencies, p)) for p in PERCENTILES),
+                min=latencies[0] if latencies else None,
+                max=latencies[-1] if latencies else None,
+                total=sum(latencies),
+            ),
+        }
+
+
+class Stats(object):
+    '''
+    Thread-safe per endpoint counts, latencies (in seconds), sizes and errors,
+    and the ``http_cache`` counts if any.
+    '''
+    def __init__(self, root, http_cache=None):
+        self.root = root
+        self.http_cache = http_cache
+        self.endpoints = defaultdict(EndpointStats)
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+
+    def record(self, method, url, status=None, latency=None, bytes_in=0, bytes_out=0,
+               bytes_wire=None):
+        '''
+        Record a call, a ``None`` status being a network error.
+
+        ``bytes_in`` is the decoded response body size and ``bytes_wire``
+        its size as transfered (compressed), defaulting to ``bytes_in``.
+        '''
+        key = endpoint_key(method, url, self.root)
+        with self.lock:
+            stats = self.endpoints[key]
+            stats.calls += 1
+            stats.statuses[status or 'error'] += 1
+            if status is None or status >= 400:
+                stats.errors += 1
+            if latency is not None:
+                stats.latencies.append(latency)
+            stats.bytes_in += bytes_in or 0
+            stats.bytes_out += bytes_out or 0
+            stats.bytes_wire += (bytes_in if bytes_wire is None else bytes_wire) or 0
+
+    def totals(self):
+        '''Overall ``(calls, errors)`` counts'''
+        with self.lock:
+            endpoints = list(self.endpoints.values())
+        return sum(e.calls for e in endpoints), sum(e.errors for e in endpoints)
+
+    def as_dict(self):
+        with self.lock:
+            endpoints = {key: stats.as_dict() for key, stats in sorted(self.endpoints.items())}
+        data = {'endpoints': endpoints}
+        if self.http_cache:
+            data['http_cache'] = self.http_cache.as_dict()
+        return data
+
+    def export(self, filename):
+        with open(filename, 'w', encoding='utf8') as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def display(self):
+        header('API calls statistics')
+        data = self.as_dict()
+        if data['endpoints']:
+            self.display_endpoints(data['endpoints'])
+        else:
+            echo('No API call')
+        if 'http_cache' in data:
+            echo('HTTP cache: {hits} hit(s), {revalidated} revalidated, {misses} miss(es)'.format(
+                **data['http_cache']))
+
+    def display_endpoints(self, data):
+        columns = (('Calls', 'Errors') + tuple('p{0} (ms)'.format(p) for p in PERCENTILES)
+                   + ('In (KB)', 'Wire (KB)', 'Out (KB)'))
+        width = max(len(key) for key in data)
+        row = '{0:<{width}}' + ''.join(' {{{0}:>10}}'.format(i) for i in range(1, len(columns) + 1))
+        echo(white(row.format('Endpoint', *columns, width=width)))
+        for key, stats in data.items():
+            latencies = ['{0:.1f}'.format(stats['latency']['p{0}'.format(p)] * 1000)
+                         for p in PERCENTILES]
+            echo(row.format(key, stats['calls'], stats['errors'], *latencies,
+                            '{0:.1f}'.format(stats['bytes_in'] / 1024.),
+                            '{0:.1f}'.format(stats['bytes_wire'] / 1024.),
+                            '{0:.1f}'.format(stats['bytes_out'] / 1024.),
+                            width=width))
+        calls = sum(stats['calls'] for stats in data.values())
+        waiting = sum(stats['latency']['total'] for stats in data.values())
+        echo('{0} call(s), {1:.1f}s cumulated waiting for the API over {2:.1f}s elapsed'.format(
+            calls, waiting, time.monotonic() - self.start))
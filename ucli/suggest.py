@@ -1,16 +1,117 @@
-import click
+import os
+import threading
+import time
+import unicodedata
 
+from . import utils
+from .cache import DiskCache
 from .utils import prompt_choices
 
 
 DEFAULT_SIZE = 10
 
+#: Default suggestions time to live in seconds
+DEFAULT_TTL = 3600
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def normalize(text):
+    '''Lowercase and strip accents for loose local matching'''
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def matches(result, q):
+    '''Wether all terms of ``q`` appear in a suggestion textual values'''
+    text = normalize(' '.join(str(v) for v in result.values() if isinstance(v, str)))
+    return all(term in text for term in normalize(q).split())
+
+
+class SuggestCache(object):
+    '''
+    Memoize suggestions in memory and on disk for ``ttl`` seconds (thread-safe).
+
+    A query may also be answered locally from a cached shorter query
+    it starts with, as long as the latter got less than ``size`` results,
+    ie. its whole result set, by narrowing it down.
+    '''
+    def __init__(self, store=None, ttl=DEFAULT_TTL):
+        self.store = store
+        self.ttl = ttl
+        self.memory = {}
+        self.lock = threading.Lock()
+
+    def key(self, endpoint, q, size):
+        return '|'.join((endpoint, q, str(size)))
+
+    def get(self, key):
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is None and self.store is not None:
+                entry = self.store.get(key)
+                if entry is not None:
+                    self.memory[key] = entry
+        if entry is None or time.time() > entry['stored'] + self.ttl:
+            return None
+        return entry['results']
+
+    def set(self, endpoint, q, size, results):
+        key = self.key(endpoint, q, size)
+        entry = {'stored': time.time(), 'results': results}
+        with self.lock:
+            self.memory[key] = entry
+            if self.store is not None:
+                self.store.set(key, entry)
+
+    def lookup(self, endpoint, q, size):
+        '''Cached results for a query, ``None`` if they need to be fetched'''
+        results = self.get(self.key(endpoint, q, size))
+        if results is not None:
+            return results
+        for length in range(len(q) - 1, 0, -1):
+            results = self.get(self.key(endpoint, q[:length], size))
+            if results is not None and len(results) < size:
+                return [r for r in results if matches(r, q)]
+        return None
+
+
+def get_cache(api):
+    '''The suggestions cache for an API instance and token, ``None`` if disabled'''
+    ttl = api.options.get('suggest_ttl', DEFAULT_TTL)
+    if not ttl:
+        return None
+    path = os.path.join(api.cache_dir, 'suggest', api.cache_namespace)
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = SuggestCache(DiskCache(path), ttl=ttl)
+        return _caches[path]
+
+
+def fetch(api, endpoint, q, size=DEFAULT_SIZE):
+    '''Fetch suggestions for ``q``, from the local index or the cache if enabled'''
+    from .index import get_index  # The index depends on this module
+
+    index = get_index(api)
+    if index:
+        results = index.search(endpoint.split('/')[0], q, size)
+        if results:
+            return results
+    cache = get_cache(api)
+    results = cache.lookup(endpoint, q, size) if cache else None
+    if results is None:
+        results = api.get(endpoint, q=q, size=size)
+        if cache:
+            cache.set(endpoint, q, size, results)
+    return results
+
 
 def suggest(prompt, api, endpoint, display, size=DEFAULT_SIZE):
     choice = 'r'
     while choice == 'r':
-        q = click.prompt(prompt)
-        results = api.get(endpoint, q=q, size=size)
+        q = utils.prompt(prompt)
+        results = fetch(api, endpoint, q, size=size)
         choices = list(enumerate((display(r) for r in results), 1))
         choices.append(('r', 'Retry'))
         choice = prompt_choices('Which one ?', *choices)
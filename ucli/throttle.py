@@ -0,0 +1,143 @@
+'''
+Client-side throttling of API calls.
+
+`TokenBucket` caps the request rate whereas `AdaptiveLimiter` caps the number
+of in-flight requests using server feedback (AIMD: additive increase while
+responses are healthy, multiplicative decrease on overload signals).
+'''
+import threading
+import time
+
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+#: Statuses signaling the server is overloaded
+OVERLOAD_STATUSES = (429, 503)
+
+#: Latency (relative to the best latency seen) above which the server is considered under pressure
+DEFAULT_LATENCY_TOLERANCE = 2.0
+
+
+def parse_retry_after(value):
+    '''Parse a ``Retry-After`` header value (delay in seconds or HTTP date) into seconds'''
+    if not value:
+        return None
+    try:
+        return max(0., float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0., (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket(object):
+    '''Allow ``rate`` requests per second on average, with bursts up to ``burst`` requests'''
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        '''Take a token if available, returns ``0`` or the delay before the next one in seconds'''
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        '''Block until a request is allowed'''
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+class AdaptiveLimiter(object):
+    '''
+    Bound the number of in-flight requests with a limit adjusted from server feedback.
+
+    The limit starts at half ``max_limit``, is halved on 429 and 503 responses
+    and all requests are paused for the ``Retry-After`` delay if any.
+    It grows by one after each window of healthy responses,
+    ie. with a smoothed latency within ``tolerance`` times the best latency seen
+    for the same endpoint, and shrinks by one when the latency degrades.
+    Latencies are compared per endpoint (any key given to `release`)
+    so that calls to a slow endpoint are not taken for a degradation of a fast one.
+    '''
+    def __init__(self, max_limit, min_limit=1, tolerance=DEFAULT_LATENCY_TOLERANCE):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.tolerance = tolerance
+        self.limit = max(min_limit, max_limit // 2)
+        self.inflight = 0
+        self.paused_until = 0
+        self.successes = 0
+        self.best_latencies = {}
+        self.latencies = {}
+        self.condition = threading.Condition()
+
+    def try_acquire(self):
+        '''
+        Take a request slot if available, returns ``0`` or the delay before trying again
+        in seconds (``None`` meaning until a slot is released).
+        '''
+        with self.condition:
+            wait = self.paused_until - time.monotonic()
+            if wait > 0:
+                return wait
+            if self.inflight < self.limit:
+                self.inflight += 1
+                return 0
+            return None
+
+    def acquire(self):
+        '''Block until a request slot is available'''
+        with self.condition:
+            while True:
+                wait = self.try_acquire()
+                if wait == 0:
+                    return
+                self.condition.wait(wait)
+
+    def release(self, status=None, latency=None, retry_after=None, endpoint=None):
+        '''
+        Release a slot, adjusting the limit given the response ``status``
+        and the ``latency`` of its ``endpoint``
+        '''
+        with self.condition:
+            self.inflight -= 1
+            if status in OVERLOAD_STATUSES:
+                self.limit = max(self.min_limit, self.limit // 2)
+                self.successes = 0
+                if retry_after:
+                    self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            elif status is not None and status < 500 and latency is not None:
+                self.observe(latency, endpoint)
+            self.condition.notify_all()
+
+    def observe(self, latency, endpoint=None):
+        best = min(latency, self.best_latencies.get(endpoint, latency))
+        self.best_latencies[endpoint] = best
+        smoothed = self.latencies.get(endpoint)
+        smoothed = latency if smoothed is None else .8 * smoothed + .2 * latency
+        self.latencies[endpoint] = smoothed
+        if smoothed <= self.tolerance * best:
+            self.successes += 1
+            if self.successes >= self.limit:
+                self.limit = min(self.max_limit, self.limit + 1)
+                self.successes = 0
+        else:
+            self.limit = max(self.min_limit, self.limit - 1)
+            self.successes = 0
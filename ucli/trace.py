@@ -0,0 +1,96 @@
+'''
+Client-side tracing and profiling.
+
+Spans are exported in the Chrome trace-event format
+and can be loaded in ``chrome://tracing`` or https://ui.perfetto.dev.
+'''
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+
+from contextlib import contextmanager
+
+
+class Tracer(object):
+    '''Collect spans as complete trace events, doing nothing until enabled'''
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+        self.origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name, category='ucli', **args):
+        '''
+        Record the enclosed block as a span.
+
+        The yielded ``args`` dict may be updated to attach details to the span.
+        '''
+        if not self.enabled:
+            yield args
+            return
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.add(name, category, start, time.perf_counter(), args)
+
+    def add(self, name, category, start, end, args=None):
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (start - self.origin) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+        }
+        if args:
+            event['args'] = args
+        with self.lock:
+            self.events.append(event)
+
+    def iterate(self, iterable, name, category='ucli'):
+        '''Wrap an iterable to record a span for each item retrieval'''
+        iterator = iter(iterable)
+        while True:
+            with self.span(name, category):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def export(self, filename):
+        with self.lock:
+            events = list(self.events)
+        with open(filename, 'w', encoding='utf8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+#: The process-wide tracer
+tracer = Tracer()
+span = tracer.span
+
+
+def start_profiling():
+    '''Start profiling the calling (main) thread'''
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def profile_report(profiler, limit=40):
+    '''Stop profiling and format the top ``limit`` functions sorted by cumulative time'''
+    profiler.disable()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
@@ -1,13 +1,21 @@
+import logging
+import os
+import re
 import sys
 
 import click
 
+from .trace import span
+
 ARROW = '➢'
 MAGNIFYING_GLASS = '🔎'
 OK = '✔'
 KO = '✘'
 WARNING = '⚠'
 
+#: Environment variable holding the instance name of a fan-out child process
+INSTANCE_ENVVAR = 'UCLI_INSTANCE'
+
 
 def color(name, **kwargs):
     return lambda t: click.style(str(t), fg=name, **kwargs)
@@ -19,7 +27,18 @@ red = color('red', bold=True)
 cyan = color('cyan')
 magenta = color('magenta', bold=True)
 white = color('white', bold=True)
-echo = click.echo
+
+
+def flush_logs():
+    '''Wait for pending log records to be written so direct output stays in order'''
+    for handler in logging.getLogger().handlers:
+        handler.flush()
+
+
+def echo(*args, **kwargs):
+    '''``click.echo`` after pending log records'''
+    flush_logs()
+    click.echo(*args, **kwargs)
 
 
 def header(msg):
@@ -50,16 +69,68 @@ def exit(msg, details=None, code=-1):
     sys.exit(code)
 
 
+def prompt(text, **kwargs):
+    '''``click.prompt`` traced as a prompt wait'''
+    flush_logs()
+    with span(text, 'prompt'):
+        return click.prompt(text, **kwargs)
+
+
+def confirm(text, **kwargs):
+    '''``click.confirm`` traced as a prompt wait'''
+    flush_logs()
+    with span(text, 'prompt'):
+        return click.confirm(text, **kwargs)
+
+
 def prompt_choices(title, *choices):
     '''Prompt for choices (key, display) pairs'''
     choices_display = '\n'.join('{0}: {1}'.format(*c) for c in choices)
     label_arrow(title, '\n'.join(('', choices_display)))
     keys = [str(c[0]) for c in choices]
-    return click.prompt('Your choice ?',
-                        type=click.Choice(keys),
-                        default=keys[0])
+    with span(title, 'prompt'):
+        return click.prompt('Your choice ?',
+                            type=click.Choice(keys),
+                            default=keys[0])
 
 
 def choice_enum(*labels):
     keys = list(map(str, range(1, 1 + len(labels))))
     return list(zip(keys, labels)), keys
+
+
+def count_rows(file, dialect='excel'):
+    '''
+    Count the data rows (header and blank lines excluded) of a CSV file
+    in a streaming pass and rewind it.
+    Returns ``None`` if the file is not seekable (ie. stdin).
+    '''
+    import csv  # Only needed by the commands reading CSV files
+    if not file.seekable():
+        return None
+    file.seek(0)
+    with span('count rows', 'csv'):
+        count = sum(1 for row in csv.reader(file, dialect=dialect) if row)
+    file.seek(0)
+    return max(0, count - 1)
+
+
+def instance_path(path, name):
+    '''Insert the instance ``name`` before the extensions of ``path`` (ie. ``plan.prod.jsonl``)'''
+    name = re.sub(r'[^\w-]+', '-', name).strip('-')
+    head, tail = os.path.split(path)
+    hidden = '.' if tail.startswith('.') else ''
+    stem, dot, extensions = tail[len(hidden):].partition('.')
+    return os.path.join(head, ''.join((hidden, stem, '.', name, dot, extensions)))
+
+
+class InstancePath(click.Path):
+    '''
+    A ``click.Path`` suffixed with the instance name when the command runs against
+    several instances, so that child processes never share the files they write.
+    '''
+    def convert(self, value, param, ctx):
+        name = os.environ.get(INSTANCE_ENVVAR)
+        if name and isinstance(value, str) and value != '-':
+            value = instance_path(value, name)
+        return super(InstancePath, self).convert(value, param, ctx)